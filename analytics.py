@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from scoring import CATEGORY_WEIGHTS, MAX_RISK, RISK_MAP
+from store import DocumentStore, get_store
+
+
+GROUP_COLUMNS = ("category", "counterparty", "contract_type", "model", "language")
+RISK_LEVELS = ["Low", "Medium", "High"]
+
+CLAUSE_QUERY = """
+SELECT c.doc_hash, c.model, c.language, c.idx, c.risk, c.category, c.created_at,
+       d.filename, COALESCE(d.counterparty, 'unknown') AS counterparty,
+       COALESCE(d.contract_type, 'unknown') AS contract_type
+FROM clause_results c JOIN documents d ON d.doc_hash = c.doc_hash
+"""
+
+
+def load_clause_frame(store: Optional[DocumentStore]=None, model: Optional[str]=None,
+                      language: Optional[str]=None, latest_only: bool=True) -> pd.DataFrame:
+    """All persisted clause results as one DataFrame, optionally filtered by model/language.
+
+    latest_only keeps a single analysis per document (the most recent) so re-analyses
+    in other models or languages are not double counted.
+    """
+    store = store or get_store()
+    conditions = []
+    params = []
+    if model:
+        conditions.append("c.model = ?")
+        params.append(model)
+    if language:
+        conditions.append("c.language = ?")
+        params.append(language)
+    query = CLAUSE_QUERY + (" WHERE " + " AND ".join(conditions) if conditions else "")
+    df = pd.read_sql_query(query, store.connection(), params=params)
+    if latest_only and not df.empty:
+        latest = df.groupby("doc_hash")["created_at"].transform("max")
+        df = df[df["created_at"].to_numpy() == latest.to_numpy()]
+    return df
+
+
+def _with_scores(df: pd.DataFrame, category_weights: Optional[Dict[str, float]]) -> pd.DataFrame:
+    risk_score = df["risk"].map(RISK_MAP).fillna(RISK_MAP["Medium"]).to_numpy(dtype=np.float64)
+    category_weights = CATEGORY_WEIGHTS if category_weights is None else category_weights
+    if category_weights:
+        weight = df["category"].map(category_weights).fillna(1.0).to_numpy(dtype=np.float64)
+    else:
+        weight = np.ones(len(df), dtype=np.float64)
+    # One-hot risk columns let a single groupby pass produce both scores and distributions
+    levels = {level: (risk_score == RISK_MAP[level]).astype(np.float64) for level in RISK_LEVELS}
+    return df.assign(risk_score=risk_score, weighted=risk_score * weight, weighted_max=weight * MAX_RISK, **levels)
+
+
+def _grouped(df: pd.DataFrame, column: str) -> List[Dict]:
+    keys = df[column].astype("category")
+    grouped = df.groupby(keys, observed=True, sort=False)
+    agg = grouped[["weighted", "weighted_max"] + RISK_LEVELS].sum()
+    counts = grouped.size()
+    agg["clauses"] = counts
+    agg["contracts"] = grouped["doc_hash"].nunique()
+    agg["score"] = (agg["weighted"] / agg["weighted_max"] * 100).round(1)
+    for level in RISK_LEVELS:
+        agg[level] = (agg[level] / counts).round(4)
+    agg = agg.sort_values("score", ascending=False).drop(columns=["weighted", "weighted_max"])
+    return agg.reset_index().rename(columns={column: "group"}).to_dict("records")
+
+
+def portfolio_report(df: pd.DataFrame, group_by: List[str]=("category", "counterparty", "contract_type"),
+                     period: Optional[str]="M", top: int=10,
+                     category_weights: Optional[Dict[str, float]]=None) -> Dict:
+    """Weighted risk scores per group and time period, risk distributions and top-risk contracts."""
+    if df.empty:
+        return {"clauses": 0, "contracts": 0, "overall_score": 0.0, "groups": {}, "periods": [], "outliers": []}
+    df = _with_scores(df, category_weights)
+
+    report = {
+        "clauses": int(len(df)),
+        "contracts": int(df["doc_hash"].nunique()),
+        "overall_score": round(float(df["weighted"].sum() / df["weighted_max"].sum() * 100), 1),
+        "distribution": {level: round(float(df[level].mean()), 4) for level in RISK_LEVELS},
+        "groups": {column: _grouped(df, column) for column in group_by if column in GROUP_COLUMNS},
+        "periods": [],
+    }
+
+    if period:
+        periods = pd.to_datetime(df["created_at"], unit="s").dt.to_period(period).astype(str)
+        report["periods"] = _grouped(df.assign(period=periods), "period")
+        report["periods"].sort(key=lambda row: row["group"])
+
+    # Contracts whose weighted score sits furthest above the portfolio mean
+    per_doc = df.groupby("doc_hash", sort=False).agg(
+        filename=("filename", "first"), counterparty=("counterparty", "first"),
+        contract_type=("contract_type", "first"), clauses=("risk_score", "size"),
+        weighted=("weighted", "sum"), weighted_max=("weighted_max", "sum"), high=("High", "sum"))
+    scores = per_doc["weighted"].to_numpy() / per_doc["weighted_max"].to_numpy() * 100
+    std = scores.std()
+    per_doc = per_doc.assign(score=scores.round(1),
+                             z_score=np.round((scores - scores.mean()) / std, 2) if std > 0 else 0.0,
+                             high=per_doc["high"].astype(int))
+    outliers = per_doc.nlargest(top, ["score", "high"]).drop(columns=["weighted", "weighted_max"])
+    report["outliers"] = outliers.reset_index().to_dict("records")
+    return report
@@ -0,0 +1,130 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+import mock_llm
+from nlp import extract_text_from_pdf, extract_text_from_docx, extract_text_from_txt, clean_text, split_into_clauses
+from llm import analyze_clauses
+from scoring import overall_risk_score
+from utils import create_pdf_report, highlight_text_html
+
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_contracts")
+DEFAULT_SCALES = [1, 10, 100]
+
+
+def extract_text(path: str) -> str:
+    # Same dispatch as the /upload route
+    if path.lower().endswith(".pdf"):
+        return extract_text_from_pdf(path)
+    elif path.lower().endswith(".docx"):
+        return extract_text_from_docx(path)
+    return extract_text_from_txt(path)
+
+
+def measure(fn: Callable, track_memory: bool) -> Tuple[Dict, Any]:
+    """Time fn once; with track_memory, run it again under tracemalloc to get peak allocation."""
+    start = time.perf_counter()
+    value = fn()
+    stats = {"seconds": round(time.perf_counter() - start, 6)}
+    if track_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            stats["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+        finally:
+            tracemalloc.stop()
+    return stats, value
+
+
+def run_pipeline(path: str, scale: int, model: str, max_clauses: int, track_memory: bool) -> Dict:
+    run = {"document": os.path.basename(path), "scale": scale, "stages": {}}
+    stages = run["stages"]
+
+    def stage(name: str, fn: Callable, units: int=0, unit: str="", memory: bool=True):
+        stats, value = measure(fn, track_memory and memory)
+        if units and stats["seconds"] > 0:
+            stats[f"{unit}_per_second"] = round(units / stats["seconds"], 1)
+        stages[name] = stats
+        return value
+
+    try:
+        raw_text = stage("extract", lambda: extract_text(path))
+        # Synthetic large contracts: the extracted text repeated scale times
+        raw_text = "\n".join([raw_text] * scale)
+        text = stage("clean_text", lambda: clean_text(raw_text), len(raw_text), "chars")
+        clauses = stage("split_into_clauses", lambda: split_into_clauses(text, max_clause_len=900), len(text), "chars")
+        clauses = clauses[:max_clauses] if max_clauses else clauses
+        # No second (tracemalloc) pass: it would repeat every LLM call and double the reported call counts
+        results = stage("analyze_clauses", lambda: analyze_clauses(clauses, model=model), len(clauses), "clauses",
+                        memory=False)
+        score = stage("overall_risk_score", lambda: overall_risk_score(results), len(results), "clauses")
+        stage("highlight_text_html", lambda: highlight_text_html(text, results), len(text), "chars")
+        stage("create_pdf_report", lambda: create_pdf_report("Benchmark summary.", score, results), len(results), "clauses")
+    except Exception as e:
+        run["error"] = str(e)
+        return run
+
+    run["text_chars"] = len(text)
+    run["clauses"] = len(clauses)
+    run["total_seconds"] = round(sum(s["seconds"] for s in stages.values()), 6)
+    return run
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv: List[str]=None):
+    parser = argparse.ArgumentParser(description="Benchmark the contract analysis pipeline with a mock LLM")
+    parser.add_argument("files", nargs="*", help="Contracts to benchmark (default: sample_contracts/*)")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Synthetic size multipliers")
+    parser.add_argument("--model", default="gpt-4", help="Model name passed through to the mock provider")
+    parser.add_argument("--max-clauses", type=int, default=0, help="Analyze at most this many clauses (0 = all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock LLM latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Mock LLM latency jitter in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mock LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass for peak memory")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(SAMPLE_DIR, "*")))
+    mock = mock_llm.install(mock_llm.MockLLM(args.latency, args.jitter, args.failure_rate, args.seed))
+    try:
+        runs = []
+        for path in files:
+            for scale in args.scales:
+                print(f"🔄 {os.path.basename(path)} x{scale}", file=sys.stderr)
+                runs.append(run_pipeline(path, scale, args.model, args.max_clauses, not args.no_memory))
+    finally:
+        mock_llm.uninstall()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mock_llm": {"latency": args.latency, "jitter": args.jitter, "failure_rate": args.failure_rate,
+                     "seed": args.seed, "calls": mock.calls, "failures": mock.failures},
+        "runs": runs
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
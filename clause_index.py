@@ -0,0 +1,374 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from store import DATA_DIR, get_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialised within the process only
+    fcntl = None
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+CLAUSE_INDEX_DIR = os.getenv("CLAUSE_INDEX_DIR", os.path.join(DATA_DIR, "clause_index"))
+# Clauses are appended to the index whenever an analysis is stored
+CLAUSE_INDEX_ENABLED = os.getenv("CLAUSE_INDEX", "1") == "1"
+# The default embedder hashes words and word pairs, so similarity is lexical (shared wording, not meaning).
+# For semantic search install sentence-transformers and name a local model here, e.g. all-MiniLM-L6-v2
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+HASHING_DIM = int(os.getenv("EMBEDDING_HASHING_DIM", "512"))
+# SimHash: 64 random hyperplanes per signature word; Hamming distance between signatures tracks the angle
+SIGNATURE_WORDS = 3
+SIGNATURE_SEED = 1234
+# Exact rerank is limited to this many candidates; indexes smaller than EXACT_SCAN_ROWS are scanned in full
+CLAUSE_INDEX_CANDIDATES = int(os.getenv("CLAUSE_INDEX_CANDIDATES", "4000"))
+EXACT_SCAN_ROWS = int(os.getenv("CLAUSE_INDEX_EXACT_SCAN_ROWS", "50000"))
+SCAN_CHUNK_ROWS = 1 << 20
+# Ranked rows checked against category/risk filters per sqlite query (stays under the bound-parameter limit)
+FILTER_BATCH_ROWS = 500
+
+CLAUSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clauses (
+    pos INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT,
+    clause TEXT NOT NULL,
+    risk TEXT,
+    category TEXT,
+    model TEXT,
+    language TEXT,
+    UNIQUE (doc_hash, idx)
+);
+"""
+
+
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams and bigrams; needs no model download."""
+
+    def __init__(self, dim: int=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint64, count=len(features))
+            signs = np.where(hashes & (1 << 31), -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], (hashes % self.dim).astype(np.intp), signs)
+        return _normalize(out)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model on CPU, loaded on first use."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _normalize(self.model.encode(texts, batch_size=32, convert_to_numpy=True).astype(np.float32))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(words)
+else:  # NumPy < 2.0
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return _BYTE_BITS[words.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def get_embedder():
+    if EMBEDDING_MODEL:
+        try:
+            return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, using hashed features instead of %s", EMBEDDING_MODEL)
+    return HashingEmbedder()
+
+
+class ClauseIndex:
+    """Append-only clause store: metadata in sqlite, float32 vectors and SimHash signatures in flat files.
+
+    Row i of vectors.f32 and of each signature file belongs to clauses.pos = i. Files are memory-mapped
+    on first search; a query scans the signatures (24 bytes per clause) for the nearest candidates
+    by Hamming distance and pages in only those vectors for exact cosine reranking.
+    """
+
+    def __init__(self, path: str=CLAUSE_INDEX_DIR, embedder=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._embedder = embedder
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clause-index")
+        self._arrays = None
+        self._meta_cache = None
+        self._conn().executescript(CLAUSE_SCHEMA)
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._file("clauses.sqlite3"), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self) -> Dict:
+        # The embedder and hyperplanes are fixed at creation; mixing embedders would make scores meaningless
+        if self._meta_cache is not None:
+            return self._meta_cache
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["embedder"] != self.embedder.name:
+                raise ValueError(f"Clause index at {self.path} was built with {meta['embedder']}, "
+                                 f"not {self.embedder.name}; rebuild it with 'python clause_index.py rebuild'")
+        else:
+            meta = {"embedder": self.embedder.name, "dim": self.embedder.dim,
+                    "words": SIGNATURE_WORDS, "seed": SIGNATURE_SEED}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        rng = np.random.default_rng(meta["seed"])
+        meta["planes"] = rng.standard_normal((meta["dim"], meta["words"] * 64)).astype(np.float32)
+        self._meta_cache = meta
+        return meta
+
+    def _signatures(self, vectors: np.ndarray, meta: Dict) -> List[np.ndarray]:
+        # One uint64 array per word, each kept in its own file so a scan reads contiguous memory
+        bits = np.packbits(vectors @ meta["planes"] > 0, axis=1, bitorder="little")
+        words = np.ascontiguousarray(bits).view(np.uint64)
+        return [np.ascontiguousarray(words[:, w]) for w in range(meta["words"])]
+
+    def count(self) -> int:
+        # pos is dense and append-only, so this is an index lookup rather than a table scan
+        return self._conn().execute("SELECT COALESCE(MAX(pos) + 1, 0) FROM clauses").fetchone()[0]
+
+    @contextmanager
+    def _writer(self):
+        # Several app workers may append to the same index
+        with self._lock, open(self._file("append.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, rows: List[Dict]) -> int:
+        """Append clauses (dicts with doc_hash, idx, clause and optional metadata).
+
+        Clauses already indexed keep their vectors, which depend only on the text, and take the
+        risk, category, model and language of the newest analysis.
+        """
+        with self._writer():
+            conn = self._conn()
+            indexed = [r for r in rows if conn.execute("SELECT 1 FROM clauses WHERE doc_hash = ? AND idx = ?",
+                                                       (r["doc_hash"], r["idx"])).fetchone()]
+            if indexed:
+                with conn:
+                    conn.executemany(
+                        "UPDATE clauses SET filename = COALESCE(?, filename), risk = ?, category = ?, model = ?, language = ? "
+                        "WHERE doc_hash = ? AND idx = ?",
+                        [(r.get("filename"), r.get("risk"), r.get("category"), r.get("model"), r.get("language"),
+                          r["doc_hash"], r["idx"]) for r in indexed])
+            rows = [r for r in rows if not any(r is i for i in indexed)]
+            if not rows:
+                return 0
+            meta = self._meta()
+            vectors = self.embedder.embed([r["clause"] for r in rows])
+            signatures = self._signatures(vectors, meta)
+            start = self.count()
+            # Drop anything a crashed append left past the committed rows, then append
+            files = [("vectors.f32", vectors)] + [(f"signature{w}.u64", s) for w, s in enumerate(signatures)]
+            for name, data in files:
+                with open(self._file(name), "ab") as f:
+                    f.truncate(start * data[:1].nbytes)
+                    f.write(np.ascontiguousarray(data).tobytes())
+            with conn:
+                conn.executemany(
+                    "INSERT INTO clauses (pos, doc_hash, idx, filename, clause, risk, category, model, language) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(start + i, r["doc_hash"], r["idx"], r.get("filename"), r["clause"], r.get("risk"),
+                      r.get("category"), r.get("model"), r.get("language")) for i, r in enumerate(rows)])
+            self._arrays = None
+            return len(rows)
+
+    def add_analysis(self, doc_hash: str, results: List[Dict], model: str, language: str) -> int:
+        document = get_store().get_document(doc_hash) or {}
+        return self.add([dict(doc_hash=doc_hash, idx=i, filename=document.get("filename"), clause=r.get("clause", ""),
+                              risk=r.get("risk"), category=r.get("category"), model=model, language=language)
+                         for i, r in enumerate(results) if r.get("clause")])
+
+    def add_analysis_async(self, doc_hash: str, results: List[Dict], model: str, language: str) -> Future:
+        """Index in the background so requests do not wait for embeddings"""
+        return self._executor.submit(self.add_analysis, doc_hash, list(results), model, language)
+
+    def _load(self):
+        n = self.count()
+        arrays = self._arrays
+        if arrays is None or arrays[0] != n:
+            if n == 0:
+                arrays = (0, None, None)
+            else:
+                meta = self._meta()
+                vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(n, meta["dim"]))
+                # Reranking reads scattered rows; without this the kernel reads ahead far past each one
+                if n > EXACT_SCAN_ROWS and hasattr(mmap, "MADV_RANDOM"):
+                    vectors._mmap.madvise(mmap.MADV_RANDOM)
+                signatures = [np.memmap(self._file(f"signature{w}.u64"), dtype=np.uint64, mode="r", shape=(n,))
+                              for w in range(meta["words"])]
+                arrays = (n, vectors, signatures)
+            self._arrays = arrays
+        return arrays
+
+    def _candidates(self, query: np.ndarray, signatures: List[np.ndarray], limit: int) -> np.ndarray:
+        query_words = [int(w[0]) for w in self._signatures(query[None, :], self._meta())]
+        # At most 192 differing bits, so uint8 distances cannot overflow
+        distance = np.zeros(len(signatures[0]), dtype=np.uint8)
+        for start in range(0, len(distance), SCAN_CHUNK_ROWS):
+            chunk = distance[start:start + SCAN_CHUNK_ROWS]
+            for words, query_word in zip(signatures, query_words):
+                chunk += _popcount(words[start:start + SCAN_CHUNK_ROWS] ^ np.uint64(query_word))
+        if len(distance) <= limit:
+            return np.arange(len(distance))
+        return np.sort(np.argpartition(distance, limit)[:limit])
+
+    def _ranked(self, query: np.ndarray, n: int, vectors: np.ndarray, signatures: List[np.ndarray], limit: int):
+        """(positions, scores) of the nearest limit candidates, or of every row in small indexes, best first"""
+        if n <= EXACT_SCAN_ROWS or limit >= n:
+            rows = np.arange(n)
+            scores = vectors @ query
+        else:
+            rows = self._candidates(query, signatures, limit)
+            scores = vectors[rows] @ query
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def _lookup(self, rows: np.ndarray, scores: np.ndarray, k: int, category: Optional[str],
+                risk: Optional[str]) -> List[Dict]:
+        # Ranked rows are checked against the filters a batch at a time until k of them match
+        batch = min(FILTER_BATCH_ROWS, k if not (category or risk) else max(k * 5, 100))
+        hits = []
+        for start in range(0, len(rows), batch):
+            by_pos = {int(p): float(s) for p, s in zip(rows[start:start + batch], scores[start:start + batch])}
+            conditions = [f"pos IN ({','.join('?' * len(by_pos))})"]
+            params = list(by_pos)
+            if category:
+                conditions.append("category = ?")
+                params.append(category)
+            if risk:
+                conditions.append("risk = ?")
+                params.append(risk)
+            found = self._conn().execute(f"SELECT * FROM clauses WHERE {' AND '.join(conditions)}", params).fetchall()
+            hits += sorted((dict(row, score=round(by_pos[row["pos"]], 4)) for row in found), key=lambda hit: -hit["score"])
+            if len(hits) >= k:
+                break
+        return hits[:k]
+
+    def search(self, query: str, k: int=10, category: Optional[str]=None, risk: Optional[str]=None,
+               candidates: int=CLAUSE_INDEX_CANDIDATES) -> List[Dict]:
+        """The k clauses most similar to query; with filters, candidates widen until k match or none are left."""
+        n, vectors, signatures = self._load()
+        if n == 0 or k <= 0 or not query.strip():
+            return []
+        q = self.embedder.embed([query])[0]
+        limit = max(candidates, k)
+        while True:
+            rows, scores = self._ranked(q, n, vectors, signatures, limit)
+            hits = self._lookup(rows, scores, k, category, risk)
+            if len(hits) >= k or len(rows) >= n:
+                return hits
+            limit *= 4
+
+    def rebuild(self) -> int:
+        """Re-index every stored analysis from scratch, e.g. after changing EMBEDDING_MODEL"""
+        with self._writer():
+            with self._conn() as conn:
+                conn.execute("DELETE FROM clauses")
+            for name in ["vectors.f32", "meta.json"] + [f"signature{w}.u64" for w in range(SIGNATURE_WORDS)]:
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._arrays = None
+            self._meta_cache = None
+        return sum(self.add_analysis(a["doc_hash"], a["results"], a["model"], a["language"])
+                   for a in get_store().iter_analyses())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_clause_index() -> ClauseIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ClauseIndex()
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic search over every analysed clause")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search", help="Find clauses similar to a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--category")
+    search.add_argument("--risk", choices=["Low", "Medium", "High"])
+    sub.add_parser("rebuild", help="Re-index all stored analyses")
+    sub.add_parser("stats", help="Show index size")
+    args = parser.parse_args()
+
+    index = get_clause_index()
+    if args.command == "search":
+        for hit in index.search(args.query, k=args.k, category=args.category, risk=args.risk):
+            print(f"{hit['score']:.3f}  [{hit['risk']}/{hit['category']}]  {hit['filename']} #{hit['idx'] + 1}: "
+                  f"{hit['clause'][:160]}")
+    elif args.command == "rebuild":
+        print(f"Indexed {index.rebuild()} clauses")
+    else:
+        print(f"{index.count()} clauses in {index.path}")
+
+
+if __name__ == "__main__":
+    main()
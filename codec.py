@@ -0,0 +1,78 @@
+import gzip
+import json
+import threading
+import zlib
+from typing import Any, Optional, Tuple
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # Optional: json + zlib is used instead
+    msgpack = None
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # Optional: HTTP responses fall back to gzip
+    brotli = None
+
+
+# First byte of every record; bump when the layout of stored values changes
+SCHEMA_VERSION = 1
+MSGPACK_ZSTD = b"m"
+JSON_ZLIB = b"j"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+_local = threading.local()
+
+
+def _zstd():
+    # Compression contexts are not thread-safe, keep one pair per thread
+    if not hasattr(_local, "compressor"):
+        _local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.compressor, _local.decompressor
+
+
+def encode(value: Any) -> bytes:
+    """Compact versioned record: msgpack + zstd when installed, else JSON + zlib."""
+    if msgpack is not None:
+        compressor, _ = _zstd()
+        return bytes([SCHEMA_VERSION]) + MSGPACK_ZSTD + compressor.compress(msgpack.packb(value, use_bin_type=True))
+    payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return bytes([SCHEMA_VERSION]) + JSON_ZLIB + zlib.compress(payload, ZLIB_LEVEL)
+
+
+def decode(blob) -> Any:
+    """Inverse of encode."""
+    blob = bytes(blob)
+    version, kind, body = blob[0], blob[1:2], blob[2:]
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"Record schema version {version} is newer than supported version {SCHEMA_VERSION}")
+    if kind == JSON_ZLIB:
+        return json.loads(zlib.decompress(body).decode("utf-8"))
+    if kind == MSGPACK_ZSTD:
+        if msgpack is None:
+            raise RuntimeError("Record was written with msgpack + zstd; install them with 'pip install msgpack zstandard'")
+        _, decompressor = _zstd()
+        return msgpack.unpackb(decompressor.decompress(body), raw=False)
+    raise ValueError(f"Unknown record encoding {kind!r}")
+
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript",
+                          "text/javascript"}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def compress_http(data: bytes, accept_encodings) -> Optional[Tuple[str, bytes]]:
+    """(content-encoding, body) for the best encoding the client accepts, or None to send data as is.
+
+    accept_encodings is werkzeug's parsed Accept-Encoding header (request.accept_encodings).
+    """
+    if brotli is not None and accept_encodings["br"]:
+        return "br", brotli.compress(data, quality=BROTLI_QUALITY)
+    if accept_encodings["gzip"]:
+        return "gzip", gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return None
@@ -0,0 +1,113 @@
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+FAKE_ANALYSIS = {
+    "explanation": "This clause allocates obligations between the parties.",
+    "risk": "Low",
+    "suggestion": "No change required."
+}
+
+
+FAKE_MODELS = ("gemma2:27b", "gemma-2b-lawer:latest", "Gemma-2-2B-Indian-Law-Q8:latest", "gemma:2b")
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Minimal imitation of the Ollama HTTP API: /api/chat, /api/generate, /api/tags, /api/ps, /api/version."""
+
+    server_version = "FakeOllama/0.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _reply_text(self, request):
+        if request.get("format"):
+            return json.dumps(FAKE_ANALYSIS)
+        return "This is a fake Ollama response."
+
+    def _track(self, model):
+        with self.server.lock:
+            self.server.loaded.add(model)
+            self.server.requests += 1
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"model": m, "name": m} for m in sorted(self.server.models)]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"model": m, "name": m} for m in sorted(self.server.loaded)]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = self._read_json()
+        model = request.get("model", "")
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        if model not in self.server.models:
+            self._send_json({"error": f"model '{model}' not found"}, 404)
+            return
+        self._track(model)
+        # An empty generate request is a load/keep_alive ping
+        if self.path == "/api/generate" and not request.get("prompt"):
+            self._send_json({"model": model, "created_at": _now(), "response": "", "done": True})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        text = self._reply_text(request)
+        base = {"model": model, "created_at": _now(), "done": True, "done_reason": "stop",
+                "prompt_eval_count": 100, "eval_count": len(text) // 4}
+        if self.path == "/api/chat":
+            base["message"] = {"role": "assistant", "content": text}
+        else:
+            base["response"] = text
+        self._send_json(base)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def start_fake_ollama(port: int=0, latency: float=0.0, models=FAKE_MODELS,
+                      handler=FakeOllamaHandler) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the fake server in a daemon thread. Point OLLAMA_HOST at the returned URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.models = set(models)
+    server.loaded = set()
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11434
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server, url = start_fake_ollama(port, latency)
+    print(f"🧪 Fake Ollama listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
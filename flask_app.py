@@ -1,6 +1,6 @@
 
 
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, Request, render_template, request, jsonify, send_file, session, redirect, url_for, g, Response
 from werkzeug.utils import secure_filename
 import os
 import tempfile
@@ -8,13 +8,26 @@ import json
 import base64
 from io import BytesIO
 import uuid
+import hashlib
+import math
+import time
 from dotenv import load_dotenv
 
 
-from nlp import extract_text_from_pdf, extract_text_from_docx, clean_text, split_into_clauses
-from llm import call_gpt4_for_clause, call_gpt4_summary, ask_question_about_contract
-from scoring import overall_risk_score
-from utils import create_pdf_report, highlight_text_html
+from nlp import extract_text_from_pdf, extract_text_from_docx, extract_text_from_txt, clean_text, split_into_clauses
+from llm import analyze_clauses, analyze_clauses_cascade, CASCADE_TRIAGE_MODEL, call_gpt4_summary, ask_question_about_contract
+from llm import translate_results, CANONICAL_LANGUAGE
+from scoring import contract_score, tag_clauses
+from utils import cached_pdf_report, highlight_text_html
+import metrics
+from tokens import estimate_analysis, clauses_within_budget
+from store import get_store, has_failed_results
+from session_store import StoreSessionInterface
+from codec import compress_http, COMPRESSIBLE_MIMETYPES
+from analytics import load_clause_frame, portfolio_report
+from clause_index import get_clause_index, CLAUSE_INDEX_ENABLED
+from scheduler import get_scheduler, set_request_class, reset_request_class
+from prefetch import get_prefetcher, SPECULATIVE_ANALYSIS, SPECULATIVE_MODEL, SPECULATIVE_LANGUAGE, SPECULATIVE_MAX_CLAUSES
 
 
 load_dotenv()
@@ -23,14 +36,166 @@ app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.secret_key = os.getenv('SECRET_KEY', 'legal-risk-bot-secret-key-2024')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024     # 16 MB max file size
 app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+# Uploads are parsed into and extracted from memory; larger ones spill to UPLOAD_FOLDER
+app.config['UPLOAD_SPILL_BYTES'] = int(os.getenv('UPLOAD_SPILL_BYTES', str(8 * 1024 * 1024)))
+# Adds a per-stage 'timings' list to JSON responses (always on when app.debug is set)
+app.config['DEBUG_TIMINGS'] = os.getenv('DEBUG_TIMINGS', '0') == '1'
+# Default /analyze mode: 'standard' or 'cascade'
+app.config['ANALYSIS_MODE'] = os.getenv('ANALYSIS_MODE', 'standard')
+# Analyse once in CANONICAL_LANGUAGE and translate to the requested language
+app.config['TRANSLATE_ANALYSIS'] = os.getenv('TRANSLATE_ANALYSIS', '0') == '1'
+# Session data lives in the document store and the cookie only holds a signed id (SERVER_SIDE_SESSIONS=0 to disable)
+if os.getenv('SERVER_SIDE_SESSIONS', '1') == '1':
+    app.session_interface = StoreSessionInterface()
+# Text and JSON responses at least this large are sent gzip/brotli compressed
+app.config['COMPRESS_MIN_BYTES'] = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+
+
+class UploadRequest(Request):
+    """Spools file parts in memory up to UPLOAD_SPILL_BYTES instead of werkzeug's fixed 500 KB"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=app.config['UPLOAD_SPILL_BYTES'], mode='rb+',
+                                             dir=app.config['UPLOAD_FOLDER'])
+
+app.request_class = UploadRequest
 
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+CLAUSE_LEN = 900
+# Endpoints whose LLM calls jump ahead of bulk analysis in the scheduler
+INTERACTIVE_PRIORITY_ENDPOINTS = {'ask_question': 'interactive', 'generate_summary': 'interactive'}
+# Endpoints that make LLM calls; only these give a browser a session and scheduler identity
+LLM_ENDPOINTS = {'upload_file', 'analyze_contract', 'generate_summary', 'ask_question'}
+
+SUPPORTED_MODELS = [
+    'gpt-4', 'gpt-3.5-turbo', 
+    'claude-3-sonnet', 'claude-3-haiku', 
+    'gemini-2.0-flash', 'gemini-pro', 
+    'ollama-gemma2:27b', 'ollama-gemma-2b-lawer:latest', 
+    'ollama-Gemma-2-2B-Indian-Law-Q8:latest', 'ollama-gemma:2b'
+]
+
+def document_clauses(doc_hash, contract_text):
+    """Clauses of a document, split once and kept in the store"""
+    clauses = get_store().get_clauses(doc_hash, CLAUSE_LEN) if doc_hash else None
+    if clauses is None:
+        clauses = split_into_clauses(contract_text, max_clause_len=CLAUSE_LEN)
+        if doc_hash:
+            get_store().save_clauses(doc_hash, CLAUSE_LEN, clauses)
+    return clauses
+
+def contract_clauses(contract_text):
+    return document_clauses(session.get('doc_hash'), contract_text)
+
+def start_speculative_analysis(file_id, doc_hash, contract_text):
+    """Begin analysing the default model/language in the background (SPECULATIVE_ANALYSIS=1)"""
+    if not SPECULATIVE_ANALYSIS:
+        return
+    stored = get_store().get_analysis(doc_hash, SPECULATIVE_MODEL, SPECULATIVE_LANGUAGE)
+    if stored and stored['analyzed_clauses'] >= SPECULATIVE_MAX_CLAUSES:
+        return
+    get_prefetcher().start(file_id, doc_hash, contract_text, document_clauses)
+
+def hash_upload(stream):
+    """SHA-256 of an uploaded file's spooled stream, rewound afterwards for extraction"""
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+def parse_budget(value, kind):
+    """A non-negative finite budget of the given type, None when absent; ValueError otherwise"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(value)
+    budget = kind(float(value))
+    if not math.isfinite(budget) or budget < 0:
+        raise ValueError(value)
+    return budget
+
+def parse_flag(value, default):
+    """A JSON boolean, or one of the strings true/false/1/0; default when absent, ValueError otherwise"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', '1', 'false', '0'):
+        return value.strip().lower() in ('true', '1')
+    raise ValueError(value)
 
 def allowed_file(filename):
     
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def classify_request():
+    # Scheduler identity: one user per browser session, tenants from the X-Tenant-ID header.
+    # Other endpoints (metrics scrapes, static files, 404s) keep the default class and never touch
+    # the session, so they do not create cookies or stored sessions
+    if request.endpoint not in LLM_ENDPOINTS:
+        return
+    if 'user_id' not in session:
+        session['user_id'] = str(uuid.uuid4())
+    tenant = request.headers.get('X-Tenant-ID', 'default')
+    priority = INTERACTIVE_PRIORITY_ENDPOINTS.get(request.endpoint, 'bulk')
+    g.request_class_token = set_request_class(session['user_id'], tenant, priority)
+
+@app.teardown_request
+def release_request_class(exc):
+    if 'request_class_token' in g:
+        reset_request_class(g.pop('request_class_token'))
+
+@app.before_request
+def start_timings():
+    g.request_start = time.perf_counter()
+    g.timings_token = metrics.start_request_timings()
+
+# Registered before finish_timings so it runs after the timings are added to the body
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or not 200 <= response.status_code < 300):
+        return response
+    data = response.get_data()
+    response.vary.add('Accept-Encoding')
+    if len(data) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    compressed = compress_http(data, request.accept_encodings)
+    if compressed:
+        response.headers['Content-Encoding'], body = compressed
+        response.set_data(body)
+    return response
+
+@app.after_request
+def finish_timings(response):
+    if 'timings_token' not in g:
+        return response
+    timings = metrics.stop_request_timings(g.pop('timings_token'))
+    elapsed = time.perf_counter() - g.request_start
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown',
+                                         method=request.method, status=response.status_code)
+    
+    if (app.debug or app.config['DEBUG_TIMINGS']) and response.is_json and not response.direct_passthrough:
+        payload = response.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload['timings'] = {'total_seconds': round(elapsed, 6), 'stages': timings}
+            response.set_data(app.json.dumps(payload))
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/scheduler')
+def scheduler_stats():
+    """Current LLM queue depth and in-flight calls"""
+    return jsonify(get_scheduler().stats())
+
 @app.route('/')
 def index():
     
@@ -52,42 +217,66 @@ def upload_file():
         
        
         filename = secure_filename(file.filename)
+        if 'file_id' in session:
+            get_prefetcher().release(session['file_id'])
         file_id = str(uuid.uuid4())
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_{filename}")
-        file.save(file_path)
+        # UploadRequest spooled the file while parsing the form; extraction reads the same stream
+        source = file.stream
+        doc_hash = hash_upload(source)
+        
+        # Optional portfolio metadata sent with the upload form
+        counterparty = request.form.get('counterparty') or None
+        contract_type = request.form.get('contract_type') or None
+        
+        existing = get_store().get_document(doc_hash)
+        if existing:
+            get_store().update_document_metadata(doc_hash, counterparty, contract_type)
+            raw_text = existing['text']
+            session['contract_text'] = raw_text
+            session['filename'] = filename
+            session['file_id'] = file_id
+            session['doc_hash'] = doc_hash
+            start_speculative_analysis(file_id, doc_hash, raw_text)
+            
+            return jsonify({
+                'success': True,
+                'filename': filename,
+                'text_preview': raw_text[:2000] + ("..." if len(raw_text) > 2000 else ""),
+                'text_length': len(raw_text),
+                'duplicate': True,
+                'previous_analyses': get_store().list_analyses(doc_hash)
+            })
         
      
         try:
             if filename.lower().endswith('.pdf'):
-                raw_text = extract_text_from_pdf(file_path)
+                raw_text = extract_text_from_pdf(source)
             elif filename.lower().endswith('.docx'):
-                raw_text = extract_text_from_docx(file_path)
+                raw_text = extract_text_from_docx(source)
             else:  # txt file
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    raw_text = f.read()
+                raw_text = extract_text_from_txt(source)
             
            
             raw_text = clean_text(raw_text)
+            get_store().save_document(doc_hash, filename, raw_text, counterparty, contract_type)
             
          
             session['contract_text'] = raw_text
             session['filename'] = filename
             session['file_id'] = file_id
+            session['doc_hash'] = doc_hash
             
-    
-            os.remove(file_path)
+            start_speculative_analysis(file_id, doc_hash, raw_text)
             
             return jsonify({
                 'success': True,
                 'filename': filename,
                 'text_preview': raw_text[:2000] + ("..." if len(raw_text) > 2000 else ""),
-                'text_length': len(raw_text)
+                'text_length': len(raw_text),
+                'duplicate': False
             })
             
         except Exception as e:
-          
-            if os.path.exists(file_path):
-                os.remove(file_path)
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
             
     except Exception as e:
@@ -104,58 +293,73 @@ def analyze_contract():
         max_clauses = data.get('max_clauses', 6)
         model = data.get('model', 'gpt-4')
         language = data.get('language', 'English')
+        # Optional budgets replace the clause count: total tokens and/or estimated seconds
+        try:
+            token_budget = parse_budget(data.get('token_budget'), int)
+            time_budget = parse_budget(data.get('time_budget'), float)
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({'error': 'token_budget and time_budget must be non-negative numbers'}), 400
+        # 'cascade' triages with a fast model and escalates risky clauses to the requested one
+        mode = data.get('mode', app.config['ANALYSIS_MODE'])
+        triage_model = data.get('triage_model', CASCADE_TRIAGE_MODEL)
+        # Translate mode reuses one canonical-language analysis for every output language
+        try:
+            translate = parse_flag(data.get('translate'), app.config['TRANSLATE_ANALYSIS'])
+        except ValueError:
+            return jsonify({'error': 'translate must be true or false'}), 400
+        analysis_language = CANONICAL_LANGUAGE if translate else language
         
        
-        supported_models = [
-            'gpt-4', 'gpt-3.5-turbo', 
-            'claude-3-sonnet', 'claude-3-haiku', 
-            'gemini-2.0-flash', 'gemini-pro', 
-            'ollama-gemma2:27b', 'ollama-gemma-2b-lawer:latest', 
-            'ollama-Gemma-2-2B-Indian-Law-Q8:latest', 'ollama-gemma:2b'
-        ]
-        if model not in supported_models:
-            return jsonify({'error': f'Unsupported model: {model}. Supported models: {supported_models}'}), 400
+        if model not in SUPPORTED_MODELS:
+            return jsonify({'error': f'Unsupported model: {model}. Supported models: {SUPPORTED_MODELS}'}), 400
+        if mode not in ('standard', 'cascade'):
+            return jsonify({'error': f'Unsupported mode: {mode}. Use standard or cascade'}), 400
+        if mode == 'cascade' and triage_model not in SUPPORTED_MODELS:
+            return jsonify({'error': f'Unsupported triage model: {triage_model}. Supported models: {SUPPORTED_MODELS}'}), 400
+        # Stored and speculative analyses are keyed by this, so cascade results never mix with single-model ones
+        analysis_model = f'cascade:{triage_model}>{model}' if mode == 'cascade' else model
         
         contract_text = session['contract_text']
         
       
-        clauses = split_into_clauses(contract_text, max_clause_len=900)
+        clauses = contract_clauses(contract_text)
+        if token_budget is not None or time_budget is not None:
+            if 'max_clauses' not in data:
+                max_clauses = len(clauses)
+            max_clauses = min(max_clauses, clauses_within_budget(clauses, model, analysis_language, token_budget, time_budget,
+                                                                 triage_model if mode == 'cascade' else None))
         clauses_to_analyze = clauses[:max_clauses]
         
-   
-        results = []
-        for idx, clause in enumerate(clauses_to_analyze):
-            try:
-                
-                parsed = call_gpt4_for_clause(clause, model=model, language=language)
-                result = {
-                    "clause": clause,
-                    "explanation": parsed.get("explanation", ""),
-                    "risk": parsed.get("risk", "Medium"),
-                    "suggestion": parsed.get("suggestion", "")
-                }
-                
-                results.append(result)
-                
-            except Exception as e:
-            
-                error_msg = f"Error analyzing clause: {str(e)}"
-                if language == "Hindi":
-                    error_msg = f"खंड विश्लेषण में त्रुटि: {str(e)}"
-                elif language == "Tamil":
-                    error_msg = f"பிரிவு பகுப்பாய்வில் பிழை: {str(e)}"
-                
-                results.append({
-                    "clause": clause,
-                    "explanation": error_msg,
-                    "risk": "Medium",
-                    "suggestion": "Please review manually" if language == "English" else 
-                                 "कृपया मैन्युअल रूप से समीक्षा करें" if language == "Hindi" else
-                                 "தயவுசெய்து கைமுறையாக மதிப்பாய்வு செய்யுங்கள்"
-                })
+        # Reuse a stored analysis of the same document when it covers the requested clauses
+        doc_hash = session.get('doc_hash')
+        stored = get_store().get_analysis(doc_hash, analysis_model, analysis_language) if doc_hash else None
+        cached = bool(stored and stored['analyzed_clauses'] >= len(clauses_to_analyze))
+        speculative = False
+        if cached:
+            results = stored['results'][:len(clauses_to_analyze)]
+        else:
+            # Attach to background work started at upload time, then finish whatever it did not cover
+            job = get_prefetcher().attach(session.get('file_id'), doc_hash, analysis_model, analysis_language) if doc_hash else None
+            results = job.wait(len(clauses_to_analyze)) if job and job.covers(clauses_to_analyze) else []
+            speculative = bool(results)
+            remaining = clauses_to_analyze[len(results):]
+            if mode == 'cascade':
+                results += analyze_clauses_cascade(remaining, model=model, language=analysis_language, triage_model=triage_model)
+            else:
+                results += analyze_clauses(remaining, model=model, language=analysis_language)
         
    
-        overall_score = overall_risk_score(results)
+        # Results stored before category tagging existed get tagged here
+        score = contract_score(tag_clauses(results))
+        overall_score = score['score']
+        # Analyses with failed clause calls are returned but never stored, indexed or reused
+        if doc_hash and not cached and not has_failed_results(results):
+            get_store().save_analysis(doc_hash, analysis_model, analysis_language, results, overall_score)
+            if CLAUSE_INDEX_ENABLED:
+                get_clause_index().add_analysis_async(doc_hash, results, analysis_model, analysis_language)
+        
+        if analysis_language != language:
+            results = translate_results(results, language, source_language=analysis_language)
         
         
         session['analysis_results'] = results
@@ -166,13 +370,79 @@ def analyze_contract():
             'success': True,
             'results': results,
             'overall_score': overall_score,
+            'category_scores': score['categories'],
             'total_clauses': len(clauses),
-            'analyzed_clauses': len(results)
+            'analyzed_clauses': len(results),
+            'cached': cached,
+            'speculative': speculative,
+            'mode': mode,
+            'translated_from': analysis_language if analysis_language != language else None,
+            # Only results re-analysed by the requested model carry the triage model's rating
+            'escalated_clauses': sum(1 for r in results if 'triage_risk' in r) if mode == 'cascade' else None
         })
         
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+@app.route('/estimate', methods=['POST'])
+def estimate_cost():
+    """Dry run: expected tokens, cost and wall time of an analysis per model"""
+    try:
+        if 'contract_text' not in session:
+            return jsonify({'error': 'No contract uploaded'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        language = data.get('language', 'English')
+        models = data.get('models') or ([data['model']] if data.get('model') else SUPPORTED_MODELS)
+        unsupported = [m for m in models if m not in SUPPORTED_MODELS]
+        if unsupported:
+            return jsonify({'error': f'Unsupported model: {unsupported[0]}. Supported models: {SUPPORTED_MODELS}'}), 400
+        
+        clauses = contract_clauses(session['contract_text'])
+        clauses = clauses[:data['max_clauses']] if data.get('max_clauses') else clauses
+        
+        return jsonify({
+            'success': True,
+            'total_clauses': len(clauses),
+            'language': language,
+            'estimates': [estimate_analysis(clauses, model, language) for model in models]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Estimate failed: {str(e)}'}), 500
+
+@app.route('/portfolio')
+def portfolio_analytics():
+    """Risk analytics over every stored analysis"""
+    try:
+        group_by = [c for c in request.args.get('group_by', 'category,counterparty,contract_type').split(',') if c]
+        period = request.args.get('period', 'M') or None
+        top = request.args.get('top', 10, type=int)
+        
+        df = load_clause_frame(model=request.args.get('model'), language=request.args.get('language'))
+        report = portfolio_report(df, group_by=group_by, period=period, top=top)
+        
+        return jsonify(dict(report, success=True))
+        
+    except Exception as e:
+        return jsonify({'error': f'Portfolio analytics failed: {str(e)}'}), 500
+
+@app.route('/search')
+def search_clauses():
+    """Semantic search over every clause analysed so far"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'No query provided'}), 400
+        k = max(1, min(request.args.get('k', 10, type=int), 100))
+        
+        hits = get_clause_index().search(query, k=k, category=request.args.get('category'), risk=request.args.get('risk'))
+        
+        return jsonify({'success': True, 'query': query, 'results': hits})
+        
+    except Exception as e:
+        return jsonify({'error': f'Search failed: {str(e)}'}), 500
+
 @app.route('/summary', methods=['POST'])
 def generate_summary():
     
@@ -183,6 +453,9 @@ def generate_summary():
         data = request.get_json()
         language = data.get('language', session.get('language', 'English'))
         model = data.get('model', 'gpt-4')
+        # Model names become metric labels, so unknown ones are rejected before any call
+        if model not in SUPPORTED_MODELS:
+            return jsonify({'error': f'Unsupported model: {model}. Supported models: {SUPPORTED_MODELS}'}), 400
         
         contract_text = session['contract_text']
         
@@ -215,6 +488,8 @@ def ask_question():
         
         results = session['analysis_results']
         model = data.get('model', 'gpt-4')
+        if model not in SUPPORTED_MODELS:
+            return jsonify({'error': f'Unsupported model: {model}. Supported models: {SUPPORTED_MODELS}'}), 400
         
     
         answer_text = ask_question_about_contract(question, results, model=model, language=language)
@@ -240,19 +515,15 @@ def export_pdf():
         summary = session.get('summary', 'No summary generated')
         filename = session.get('filename', 'contract')
         
-        # Generate PDF 
-        pdf_bytes = create_pdf_report(summary, overall_score, results)
-        
-        # Create a BytesIO object
-        pdf_buffer = BytesIO(pdf_bytes)
-        pdf_buffer.seek(0)
+        # Rendered once per analysis and streamed from the report cache
+        pdf_file = cached_pdf_report(summary, overall_score, results)
         
         # Generate filename
         safe_filename = secure_filename(filename.rsplit('.', 1)[0] if '.' in filename else filename)
         pdf_filename = f"{safe_filename}_risk_analysis.pdf"
         
         return send_file(
-            pdf_buffer,
+            pdf_file,
             as_attachment=True,
             download_name=pdf_filename,
             mimetype='application/pdf'
@@ -285,6 +556,8 @@ def get_highlighted_contract():
 @app.route('/reset')
 def reset_session():
     """Reset the session"""
+    if 'file_id' in session:
+        get_prefetcher().release(session['file_id'])
     session.clear()
     return redirect(url_for('index'))
 
@@ -4,14 +4,24 @@ import time
 from openai import OpenAI
 import google.generativeai as genai
 import anthropic
-import ollama
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 import json
+import logging
+import re
+import ast
 from dotenv import load_dotenv
+from ollama_backend import get_ollama_backend
+import metrics
+from singleflight import get_singleflight, flight_key
+from scheduler import get_scheduler
+from scoring import tag_clauses
+from store import get_store
 
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -120,19 +130,244 @@ SUMMARY_PROMPT_TAMIL = """
 தெளிவான, வணிக-நட்பு தமிழில் எழுதுங்கள்.
 """
 
-def call_ai_model(prompt: str, model: str="gpt-4", system_message: str="You are a helpful legal assistant.", max_tokens: int=512) -> str:
+CLAUSE_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "explanation": {"type": "string"},
+        "risk": {"type": "string", "enum": ["Low", "Medium", "High"]},
+        "suggestion": {"type": "string"},
+    },
+    "required": ["explanation", "risk", "suggestion"],
+}
+
+TRIAGE_SCHEMA = {
+    "type": "object",
+    "properties": dict(CLAUSE_ANALYSIS_SCHEMA["properties"], confidence={"type": "number"}),
+    "required": CLAUSE_ANALYSIS_SCHEMA["required"] + ["confidence"],
+}
+
+TRIAGE_PROMPT_SUFFIX = """
+Also include the key "confidence": a number between 0 and 1 stating how certain you are of the risk rating.
+"""
+
+JSON_REPAIR_PROMPT = """
+Your previous reply could not be parsed as JSON.
+Return the same analysis again as a single JSON object with exactly the keys "explanation", "risk" and "suggestion".
+"risk" must be one of ["Low","Medium","High"]. Do not add markdown fences or any text outside the JSON object.
+
+Previous reply:
+\"\"\"{reply}\"\"\"
+"""
+
+# Base gpt-4 and gemini-pro reject native JSON mode, they rely on the tolerant parser alone
+OPENAI_JSON_MODE_UNSUPPORTED = {"gpt-4"}
+GEMINI_JSON_MODE_MODELS = {"gemini-2.0-flash"}
+
+CLAUSE_MAX_TOKENS = 1024
+
+# Cascade mode: a fast model triages every clause, the requested model only re-analyses risky or uncertain ones
+CASCADE_TRIAGE_MODEL = os.getenv("CASCADE_TRIAGE_MODEL", "claude-3-haiku")
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.7"))
+CASCADE_ESCALATE_RISKS = {r.strip() for r in os.getenv("CASCADE_ESCALATE_RISKS", "Medium,High").split(",") if r.strip()}
+
+# Retries issued only when the tolerant parser and repair both fail
+JSON_RETRY_LIMIT = 1
+
+# Translate mode: analyse once in CANONICAL_LANGUAGE, then translate explanations with a cheaper model
+CANONICAL_LANGUAGE = os.getenv("CANONICAL_LANGUAGE", "English")
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "gpt-3.5-turbo")
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "8"))
+TRANSLATION_MAX_TOKENS = 3072
+
+TRANSLATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "explanation": {"type": "string"},
+                    "suggestion": {"type": "string"},
+                },
+                "required": ["id", "explanation", "suggestion"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+TRANSLATION_PROMPT = """
+Translate the "explanation" and "suggestion" of every item below from {source} into clear, business-friendly {target}.
+Keep legal meaning, numbers, names and defined terms intact. Do not add, drop or reorder items and keep each "id".
+Return a single JSON object: {{"items": [{{"id": ..., "explanation": "...", "suggestion": "..."}}]}}
+
+Items:
+{items}
+"""
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"})
+
+
+def _first_json_object(text: str) -> Optional[str]:
+    # Scan for the first balanced {...} block, ignoring braces inside strings
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        # Unbalanced object, try the next opening brace
+        start = text.find("{", start + 1)
+    return None
+
+
+def _escape_control_chars(candidate: str) -> str:
+    # Models often emit raw newlines/tabs inside JSON strings
+    out = []
+    in_string = False
+    escaped = False
+    for ch in candidate:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\r":
+                ch = "\\r"
+            elif ch == "\t":
+                ch = "\\t"
+        elif ch == '"':
+            in_string = True
+        out.append(ch)
+    return "".join(out)
+
+
+def _repair_json(candidate: str) -> Optional[Dict]:
+    repaired = candidate.translate(_SMART_QUOTES)
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired)
+    repaired = _escape_control_chars(repaired)
+    try:
+        return json.loads(repaired)
+    except ValueError:
+        pass
+    # Python-style dicts with single quotes or True/False/None
+    try:
+        value = ast.literal_eval(repaired)
+        return value if isinstance(value, dict) else None
+    except (ValueError, SyntaxError):
+        return None
+
+
+def parse_json_response(text: str) -> Optional[Dict]:
+    """Extract a JSON object from a model reply, tolerating fences, prose and common defects."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return value
+    except ValueError:
+        pass
+
+    candidates = [m.group(1) for m in _FENCE_RE.finditer(text)]
+    candidates.append(text)
+    for candidate in candidates:
+        obj = _first_json_object(candidate)
+        if obj is None:
+            continue
+        try:
+            value = json.loads(obj)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        value = _repair_json(obj)
+        if value is not None:
+            return value
+    return None
+
+
+def normalize_risk(value) -> str:
+    label = str(value or "").strip().lower()
+    for risk in ("Low", "Medium", "High"):
+        if label.startswith(risk.lower()):
+            return risk
+    return "Medium"
+
+
+def _gemini_schema(schema: Dict) -> Dict:
+    # The Gemini SDK accepts a subset of JSON schema: no "enum" without "format", no "required" on leaves
+    if schema["type"] == "array":
+        return {"type": "array", "items": _gemini_schema(schema["items"])}
+    if schema["type"] != "object":
+        return {"type": schema["type"]}
+    properties = {key: _gemini_schema(prop) for key, prop in schema.get("properties", {}).items()}
+    return {"type": "object", "properties": properties, "required": schema.get("required", [])}
+
+
+def call_ai_model(prompt: str, model: str="gpt-4", system_message: str="You are a helpful legal assistant.", max_tokens: int=512, json_schema: Optional[Dict]=None, kind: str="other") -> str:
+    """kind labels the call's latency and token metrics (clause, triage, summary, ask, translation)."""
+    provider = metrics.provider_for(model)
+    # Every provider call waits for a slot from the process-wide fair scheduler
+    with get_scheduler().slot(), metrics.llm_call_kind(kind):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            text = _call_provider(prompt, model, system_message, max_tokens, json_schema)
+            status = "ok"
+            return text
+        except Exception:
+            metrics.LLM_ERRORS.inc(provider=provider, model=model)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.LLM_REQUEST_SECONDS.observe(elapsed, provider=provider, model=model, kind=kind, status=status)
+            metrics.record_request_timing(f"llm:{model}", elapsed)
+
+def _call_provider(prompt: str, model: str, system_message: str, max_tokens: int, json_schema: Optional[Dict]) -> str:
   
     try:
         if model.startswith("gpt-"):
             # OpenAI models
+            extra = {}
+            if json_schema and model not in OPENAI_JSON_MODE_UNSUPPORTED:
+                extra["response_format"] = {"type": "json_object"}
             resp = openai_client.chat.completions.create(
                 model=model,
                 messages=[{"role":"system","content":system_message},
                           {"role":"user","content":prompt}],
                 temperature=0.0,
                 max_tokens=max_tokens,
-                n=1
+                n=1,
+                **extra
             )
+            if resp.usage:
+                metrics.record_tokens(model, resp.usage.prompt_tokens, resp.usage.completion_tokens)
             return resp.choices[0].message.content.strip()
         
         elif model.startswith("claude-3"):
@@ -148,13 +383,28 @@ def call_ai_model(prompt: str, model: str="gpt-4", system_message: str="You are
             
             api_model = model_mapping.get(model, "claude-3-sonnet-20240229")
             
+            extra = {}
+            if json_schema:
+                # Forced tool use makes Claude return the schema-shaped object as tool input
+                extra["tools"] = [{
+                    "name": "record_analysis",
+                    "description": "Record the structured analysis.",
+                    "input_schema": json_schema
+                }]
+                extra["tool_choice"] = {"type": "tool", "name": "record_analysis"}
+            
             response = anthropic_client.messages.create(
                 model=api_model,
                 max_tokens=max_tokens,
                 temperature=0.0,
                 system=system_message,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                **extra
             )
+            metrics.record_tokens(model, response.usage.input_tokens, response.usage.output_tokens)
+            for block in response.content:
+                if block.type == "tool_use":
+                    return json.dumps(block.input, ensure_ascii=False)
             return response.content[0].text.strip()
         
         elif model.startswith("gemini-"):
@@ -170,18 +420,25 @@ def call_ai_model(prompt: str, model: str="gpt-4", system_message: str="You are
             api_model = model_mapping.get(model, "gemini-2.0-flash-exp")
             gemini_model = genai.GenerativeModel(api_model)
             full_prompt = f"{system_message}\n\n{prompt}"
-            response = gemini_model.generate_content(full_prompt)
+            if json_schema and model in GEMINI_JSON_MODE_MODELS:
+                response = gemini_model.generate_content(
+                    full_prompt,
+                    generation_config=genai.GenerationConfig(
+                        response_mime_type="application/json",
+                        response_schema=_gemini_schema(json_schema)
+                    )
+                )
+            else:
+                response = gemini_model.generate_content(full_prompt)
+            usage = getattr(response, "usage_metadata", None)
+            if usage:
+                metrics.record_tokens(model, usage.prompt_token_count, usage.candidates_token_count)
             return response.text.strip()
         
         elif model.startswith("ollama-"):
-            # Ollama models
+            # Ollama models, served through the warm local backend
             model_name = model.replace("ollama-", "")
-            full_prompt = f"{system_message}\n\n{prompt}"
-            
-            response = ollama.chat(model=model_name, messages=[
-                {'role': 'user', 'content': full_prompt}
-            ])
-            return response['message']['content'].strip()
+            return get_ollama_backend().chat(model_name, prompt, system_message, max_tokens, json_mode=bool(json_schema))
         
         else:
             raise Exception(f"Unsupported model: {model}")
@@ -189,7 +446,8 @@ def call_ai_model(prompt: str, model: str="gpt-4", system_message: str="You are
     except Exception as e:
         raise Exception(f"Error calling {model}: {str(e)}")
 
-def call_gpt4_for_clause(clause: str, model: str="gpt-4", language: str="English", timeout: int=30) -> Dict:
+def build_clause_prompt(clause: str, language: str="English") -> Tuple[str, str]:
+    """(prompt, system_message) used for clause analysis in the given language."""
     if language == "Hindi":
         prompt = CLAUSE_ANALYSIS_PROMPT_HINDI.format(clause=clause)
         system_message = "आप एक सहायक कानूनी सहायक हैं।"
@@ -199,24 +457,183 @@ def call_gpt4_for_clause(clause: str, model: str="gpt-4", language: str="English
     else:
         prompt = CLAUSE_ANALYSIS_PROMPT_ENGLISH.format(clause=clause)
         system_message = "You are a helpful legal assistant."
+    return prompt, system_message
+
+def call_gpt4_for_clause(clause: str, model: str="gpt-4", language: str="English", timeout: int=30) -> Dict:
+    prompt, system_message = build_clause_prompt(clause, language)
     
     try:
-      
-        text = call_ai_model(prompt, model, system_message, 1024)
-        # parse JSON
-        try:
-            parsed = json.loads(text)
-            if not parsed.get("explanation"):
-                parsed["explanation"] = "Analysis not available"
-            if not parsed.get("risk"):
-                parsed["risk"] = "Medium"
-            if not parsed.get("suggestion"):
-                parsed["suggestion"] = "Please review with legal counsel"
-        except Exception:
-            parsed = {"explanation": text, "risk":"Medium", "suggestion": "Please review with legal counsel"}
-        return parsed
+        # Identical concurrent requests share one provider call
+        key = flight_key("clause", prompt, model, language)
+        return dict(get_singleflight().do(key, lambda: _analyze_clause(prompt, system_message, model), kind="clause"))
     except Exception as e:
-        return {"explanation": f"Error analyzing clause: {str(e)}", "risk":"Medium", "suggestion": "Please review manually"}
+        return {"explanation": f"Error analyzing clause: {str(e)}", "risk":"Medium", "suggestion": "Please review manually", "error": True}
+
+def _analyze_clause(prompt: str, system_message: str, model: str, schema: Dict=CLAUSE_ANALYSIS_SCHEMA,
+                    kind: str="clause") -> Dict:
+    text = call_ai_model(prompt, model, system_message, CLAUSE_MAX_TOKENS, json_schema=schema, kind=kind)
+    parsed = parse_json_response(text)
+    # Only spend another call when the reply could not be repaired locally
+    retries = 0
+    while parsed is None and retries < JSON_RETRY_LIMIT:
+        retries += 1
+        metrics.LLM_RETRIES.inc(provider=metrics.provider_for(model), model=model, reason="invalid_json")
+        repair_prompt = prompt + JSON_REPAIR_PROMPT.format(reply=text[:2000])
+        text = call_ai_model(repair_prompt, model, system_message, CLAUSE_MAX_TOKENS, json_schema=schema, kind=kind)
+        parsed = parse_json_response(text)
+    
+    if parsed is None:
+        return {"explanation": text, "risk":"Medium", "suggestion": "Please review with legal counsel"}
+    if not parsed.get("explanation"):
+        parsed["explanation"] = "Analysis not available"
+    parsed["risk"] = normalize_risk(parsed.get("risk"))
+    if not parsed.get("suggestion"):
+        parsed["suggestion"] = "Please review with legal counsel"
+    return parsed
+
+def _analysis_error_result(clause: str, error: Exception, language: str) -> Dict:
+    """Placeholder for a clause whose analysis failed; flagged "error" so it is never stored"""
+    error_msg = f"Error analyzing clause: {str(error)}"
+    if language == "Hindi":
+        error_msg = f"खंड विश्लेषण में त्रुटि: {str(error)}"
+    elif language == "Tamil":
+        error_msg = f"பிரிவு பகுப்பாய்வில் பிழை: {str(error)}"
+    
+    return {
+        "clause": clause,
+        "explanation": error_msg,
+        "risk": "Medium",
+        "suggestion": "Please review manually" if language == "English" else 
+                     "कृपया मैन्युअल रूप से समीक्षा करें" if language == "Hindi" else
+                     "தயவுசெய்து கைமுறையாக மதிப்பாய்வு செய்யுங்கள்",
+        "error": True
+    }
+
+def triage_clause(clause: str, model: str=CASCADE_TRIAGE_MODEL, language: str="English") -> Dict:
+    """Full clause analysis plus a 0-1 "confidence" in the risk rating, meant for a fast model."""
+    prompt, system_message = build_clause_prompt(clause, language)
+    prompt += TRIAGE_PROMPT_SUFFIX
+    
+    try:
+        key = flight_key("triage", prompt, model, language)
+        parsed = dict(get_singleflight().do(key, lambda: _analyze_clause(prompt, system_message, model, TRIAGE_SCHEMA, "triage"), kind="triage"))
+    except Exception as e:
+        return {"explanation": f"Error analyzing clause: {str(e)}", "risk":"Medium", "suggestion": "Please review manually", "confidence": 0.0, "error": True}
+    try:
+        parsed["confidence"] = min(1.0, max(0.0, float(parsed.get("confidence", 0.0))))
+    except (TypeError, ValueError):
+        parsed["confidence"] = 0.0
+    return parsed
+
+def _map_clauses(fn, clauses: List[str], model: str) -> List[Dict]:
+    # Local Ollama models run up to OLLAMA_NUM_PARALLEL requests at once
+    if model.startswith("ollama-"):
+        return get_ollama_backend().map(fn, clauses)
+    return [fn(clause) for clause in clauses]
+
+def analyze_clauses(clauses: List[str], model: str="gpt-4", language: str="English") -> List[Dict]:
+    """Analyze clauses in order. Each result records the model that produced it and the clause category."""
+    
+    def analyze_one(clause: str) -> Dict:
+        try:
+            parsed = call_gpt4_for_clause(clause, model=model, language=language)
+            result = {
+                "clause": clause,
+                "explanation": parsed.get("explanation", ""),
+                "risk": parsed.get("risk", "Medium"),
+                "suggestion": parsed.get("suggestion", ""),
+                "model": model
+            }
+            if parsed.get("error"):
+                result["error"] = True
+            return result
+        except Exception as e:
+            return dict(_analysis_error_result(clause, e, language), model=model)
+    
+    return tag_clauses(_map_clauses(analyze_one, clauses, model))
+
+def analyze_clauses_cascade(clauses: List[str], model: str="gpt-4", language: str="English",
+                            triage_model: str=CASCADE_TRIAGE_MODEL) -> List[Dict]:
+    """Triage every clause with triage_model and re-analyse only risky or low-confidence ones with model."""
+    
+    def triage_one(clause: str) -> Dict:
+        parsed = triage_clause(clause, model=triage_model, language=language)
+        result = {
+            "clause": clause,
+            "explanation": parsed.get("explanation", ""),
+            "risk": parsed.get("risk", "Medium"),
+            "suggestion": parsed.get("suggestion", ""),
+            "model": triage_model,
+            "confidence": parsed["confidence"]
+        }
+        if parsed.get("error"):
+            result["error"] = True
+        return result
+    
+    results = _map_clauses(triage_one, clauses, triage_model)
+    escalate = [i for i, r in enumerate(results)
+                if r["risk"] in CASCADE_ESCALATE_RISKS or r["confidence"] < CASCADE_CONFIDENCE_THRESHOLD]
+    detailed = analyze_clauses([clauses[i] for i in escalate], model=model, language=language)
+    for i, result in zip(escalate, detailed):
+        result["triage_risk"] = results[i]["risk"]
+        result["confidence"] = results[i]["confidence"]
+        results[i] = result
+    return tag_clauses(results)
+
+def translation_key(result: Dict) -> str:
+    """Cache key of a result's translatable text"""
+    return flight_key(result.get("explanation", ""), result.get("suggestion", ""))
+
+def _translate_batch(items: List[Dict], source: str, target: str, model: str) -> Dict[int, Dict]:
+    prompt = TRANSLATION_PROMPT.format(source=source, target=target, items=json.dumps(items, ensure_ascii=False, indent=1))
+    text = call_ai_model(prompt, model, "You are a professional legal translator.", TRANSLATION_MAX_TOKENS,
+                         json_schema=TRANSLATION_SCHEMA, kind="translation")
+    parsed = parse_json_response(text) or {}
+    translated = {}
+    for item in parsed.get("items", []):
+        if isinstance(item, dict) and item.get("explanation") and type(item.get("id")) is int \
+                and 0 <= item["id"] < len(items):
+            translated[item["id"]] = {"explanation": str(item["explanation"]), "suggestion": str(item.get("suggestion", ""))}
+    return translated
+
+def translate_results(results: List[Dict], language: str, source_language: str=CANONICAL_LANGUAGE,
+                      model: str=TRANSLATION_MODEL) -> List[Dict]:
+    """Copies of results with explanation and suggestion translated; risk and all other fields are unchanged.
+
+    Translations are cached per (text hash, language), identical texts are translated once and the
+    rest are sent in batches of TRANSLATION_BATCH_SIZE per call. Items the model fails to return keep
+    the source text and are marked "translated": False.
+    """
+    if language == source_language or not results:
+        return [dict(r) for r in results]
+    store = get_store()
+    keys = [translation_key(r) for r in results]
+    translations = store.get_translations(set(keys), language)
+    
+    pending = {}
+    for key, result in zip(keys, results):
+        if key not in translations and key not in pending:
+            pending[key] = result
+    pending = list(pending.items())
+    for start in range(0, len(pending), TRANSLATION_BATCH_SIZE):
+        batch = pending[start:start + TRANSLATION_BATCH_SIZE]
+        items = [{"id": i, "explanation": r.get("explanation", ""), "suggestion": r.get("suggestion", "")}
+                 for i, (_, r) in enumerate(batch)]
+        try:
+            translated = _translate_batch(items, source_language, language, model)
+        except Exception as e:
+            # The batch keeps its source text and is marked "translated": False
+            logger.warning("Translation of %d results to %s failed: %s", len(batch), language, e)
+            continue
+        fresh = {batch[i][0]: t for i, t in translated.items()}
+        store.save_translations(language, model, fresh)
+        translations.update(fresh)
+    
+    out = []
+    for key, result in zip(keys, results):
+        translation = translations.get(key)
+        out.append(dict(result, **(translation or {}), language=language, translated=translation is not None))
+    return out
 
 def call_gpt4_summary(contract_text: str, model: str="gpt-4", language: str="English") -> str:
     
@@ -232,7 +649,8 @@ def call_gpt4_summary(contract_text: str, model: str="gpt-4", language: str="Eng
     
     try:
      
-        return call_ai_model(prompt, model, system_message, 800)
+        key = flight_key("summary", prompt, model, language)
+        return get_singleflight().do(key, lambda: call_ai_model(prompt, model, system_message, 800, kind="summary"), kind="summary")
     except Exception as e:
         return f"Error generating summary: {str(e)}"
 
@@ -294,6 +712,6 @@ Answer in clear, business-friendly English."""
         system_message = "You are a helpful legal assistant."
     
     try:
-        return call_ai_model(prompt, model, system_message, 600)
+        return call_ai_model(prompt, model, system_message, 600, kind="ask")
     except Exception as e:
         return f"Error answering question: {str(e)}"
@@ -0,0 +1,307 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import requests
+
+try:
+    import psutil
+except ImportError:  # Optional: only needed for worker memory where /proc is unavailable
+    psutil = None
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONTRACT = os.path.join(ROOT, "sample_contracts", "High Risk Land Agreement.pdf")
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16]
+FLOW_STEPS = ["upload", "analyze", "summary", "ask", "export_pdf"]
+PERCENTILES = [50, 90, 95, 99]
+QUESTION = "Who is responsible for paying taxes on the property?"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=ROOT).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, process: Optional[subprocess.Popen], timeout: float=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args[1:3])} exited with code {process.returncode} during startup")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn(cmd: List[str], env: Optional[Dict]=None) -> subprocess.Popen:
+    # Own process group, so gunicorn's workers are stopped along with the master
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            start_new_session=os.name == "posix")
+
+
+def stop(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    if os.name == "posix":
+        os.killpg(process.pid, signal.SIGTERM)
+    else:
+        process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def start_stub(args) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    process = spawn([sys.executable, os.path.join(ROOT, "stub_llm_server.py"), "--port", str(port),
+                     "--latency", str(args.latency), "--jitter", str(args.jitter),
+                     "--error-rate", str(args.error_rate)])
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/api/version", process)
+    return process, url
+
+
+def start_app(args, stub_url: str, data_dir: str) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(os.environ,
+               OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"{stub_url}/v1",
+               ANTHROPIC_API_KEY="stub", ANTHROPIC_BASE_URL=stub_url,
+               OLLAMA_HOST=stub_url, DATA_DIR=data_dir, SPECULATIVE_ANALYSIS="0",
+               SECRET_KEY=os.environ.get("SECRET_KEY", uuid.uuid4().hex))
+    if args.server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers),
+               "--worker-class", args.worker_class, "--threads", str(args.threads), "--timeout", "300",
+               "--log-level", "warning", "flask_app:app"]
+    else:
+        cmd = [sys.executable, "-m", "waitress", f"--listen=127.0.0.1:{port}", f"--threads={args.threads}",
+               "flask_app:app"]
+    process = spawn(cmd, env)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/scheduler", process, timeout=120)
+    return process, url
+
+
+def worker_pids(pid: int) -> List[int]:
+    """Worker processes of a server (its children), or the server itself when it does not fork."""
+    children = []
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        with open(path) as f:
+            children += [int(p) for p in f.read().split()]
+    if not children and psutil is not None:
+        children = [child.pid for child in psutil.Process(pid).children()]
+    return children or [pid]
+
+
+def memory_mb(pid: int) -> Dict:
+    """Resident and peak resident memory of one process"""
+    if not os.path.exists(f"/proc/{pid}/status"):
+        if psutil is None:
+            return {}
+        info = psutil.Process(pid).memory_info()
+        return {"rss_mb": round(info.rss / 2**20, 1), "peak_mb": round(getattr(info, "peak_wset", info.rss) / 2**20, 1)}
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        return {}
+    return {"rss_mb": values.get("VmRSS"), "peak_mb": values.get("VmHWM")}
+
+
+def run_flow(base_url: str, contract: bytes, filename: str, args) -> List[Dict]:
+    """One user session: upload -> analyze -> summary -> ask -> export-pdf, stopping at the first failure."""
+    session = requests.Session()
+    if not args.shared_upload:
+        # A unique trailer gives every upload its own hash, so the document store cannot serve a cached analysis
+        contract = contract + f"\n%{uuid.uuid4().hex}\n".encode("ascii")
+    steps = [
+        ("upload", lambda: session.post(f"{base_url}/upload", files={"file": (filename, contract)})),
+        ("analyze", lambda: session.post(f"{base_url}/analyze", json={
+            "max_clauses": args.max_clauses, "model": args.model, "language": args.language})),
+        ("summary", lambda: session.post(f"{base_url}/summary", json={"model": args.model, "language": args.language})),
+        ("ask", lambda: session.post(f"{base_url}/ask", json={"question": QUESTION, "model": args.model})),
+        ("export_pdf", lambda: session.get(f"{base_url}/export-pdf")),
+    ]
+    records = []
+    for name, send in steps:
+        start = time.perf_counter()
+        try:
+            response = send()
+            ok = response.status_code == 200
+            if ok and response.headers.get("Content-Type", "").startswith("application/json"):
+                ok = "error" not in response.json()
+            error = None if ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            ok, error = False, type(e).__name__
+        records.append({"step": name, "seconds": time.perf_counter() - start, "ok": ok, "error": error})
+        if not ok:
+            break
+    return records
+
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {}
+    stats = {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    stats["max"] = round(max(values), 4)
+    return stats
+
+
+def stub_stats(stub_url: Optional[str]) -> Dict:
+    return requests.get(f"{stub_url}/stub/stats", timeout=5).json() if stub_url else {}
+
+
+def run_level(base_url: str, concurrency: int, contract: bytes, filename: str, args,
+              server: Optional[subprocess.Popen], stub_url: Optional[str]) -> Dict:
+    """Closed loop: concurrency users run flows back to back for args.duration seconds."""
+    llm_before = stub_stats(stub_url)
+    flows = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def user():
+        while time.monotonic() < deadline:
+            records = run_flow(base_url, contract, filename, args)
+            with lock:
+                flows.append(records)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    records = [r for flow in flows for r in flow]
+    completed = [flow for flow in flows if len(flow) == len(FLOW_STEPS) and flow[-1]["ok"]]
+    errors = {}
+    for r in records:
+        if not r["ok"]:
+            key = f"{r['step']}: {r['error']}"
+            errors[key] = errors.get(key, 0) + 1
+    level = {
+        "concurrency": concurrency,
+        "seconds": round(wall, 2),
+        "flows": len(flows),
+        "completed_flows": len(completed),
+        "flows_per_second": round(len(completed) / wall, 3),
+        "requests_per_second": round(len(records) / wall, 3),
+        "error_rate": round(sum(1 for r in records if not r["ok"]) / max(len(records), 1), 4),
+        "errors": errors,
+        "flow_latency": percentiles([sum(r["seconds"] for r in flow) for flow in completed]),
+        "steps": {step: percentiles([r["seconds"] for r in records if r["step"] == step and r["ok"]])
+                  for step in FLOW_STEPS},
+    }
+    if stub_url:
+        # The app turns most provider failures into fallback text, so count them at the stub
+        llm_after = stub_stats(stub_url)
+        level["llm_calls"] = llm_after["requests"] - llm_before["requests"]
+        level["llm_errors"] = llm_after["errors"] - llm_before["errors"]
+        level["llm_calls_per_flow"] = round(level["llm_calls"] / max(len(flows), 1), 2)
+    if server is not None:
+        level["workers"] = [dict(pid=pid, **memory_mb(pid)) for pid in worker_pids(server.pid)]
+    return level
+
+
+def main(argv: List[str]=None):
+    parser = argparse.ArgumentParser(description="Load-test the Flask app under a production server against a stub LLM")
+    parser.add_argument("--server", choices=["gunicorn", "waitress"], default="gunicorn" if os.name == "posix" else "waitress")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--worker-class", default="gthread", help="gunicorn worker class (sync, gthread, gevent, ...)")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker")
+    parser.add_argument("--url", help="Test an already running app instead of starting one (and no stub)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY, help="Concurrent users per level")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Stub LLM latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub LLM calls that fail")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--max-clauses", type=int, default=6)
+    parser.add_argument("--contract", default=DEFAULT_CONTRACT, help="PDF or TXT contract uploaded by every user")
+    parser.add_argument("--shared-upload", action="store_true",
+                        help="Upload identical bytes every time, exercising the document-store cache")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.contract, "rb") as f:
+        contract = f.read()
+    filename = os.path.basename(args.contract)
+
+    stub = server = stub_url = None
+    data_dir = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            stub, stub_url = start_stub(args)
+            server, base_url = start_app(args, stub_url, data_dir)
+            print(f"🚀 {args.server} on {base_url}, stub LLM on {stub_url}", file=sys.stderr)
+
+        levels = []
+        for concurrency in args.concurrency:
+            level = run_level(base_url, concurrency, contract, filename, args, server, stub_url)
+            levels.append(level)
+            flow = level["flow_latency"]
+            memory = ", ".join(f"{w.get('rss_mb')}" for w in level.get("workers", []))
+            print(f"👥 {concurrency:>3} users: {level['flows_per_second']:.2f} flows/s, "
+                  f"{level['requests_per_second']:.2f} req/s, flow p50 {flow.get('p50', 0):.2f}s "
+                  f"p95 {flow.get('p95', 0):.2f}s, errors {level['error_rate']:.1%}"
+                  + (f", LLM errors {level['llm_errors']}/{level['llm_calls']}" if stub_url else "")
+                  + (f", worker RSS MB [{memory}]" if memory else ""), file=sys.stderr)
+    finally:
+        for process in (server, stub):
+            if process is not None:
+                stop(process)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": None if args.url else {"name": args.server, "workers": args.workers if args.server == "gunicorn" else 1,
+                                        "worker_class": args.worker_class if args.server == "gunicorn" else "threads",
+                                        "threads": args.threads},
+        "stub_llm": None if args.url else {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate},
+        "flow": {"steps": FLOW_STEPS, "model": args.model, "language": args.language, "max_clauses": args.max_clauses,
+                 "contract": filename, "shared_upload": args.shared_upload},
+        "levels": levels
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Load test report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
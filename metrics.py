@@ -0,0 +1,198 @@
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Per-request timing breakdown; None outside an instrumented request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+# Kind of LLM call in progress (clause, summary, ...), attached to the tokens it reports
+_llm_call_kind = contextvars.ContextVar("llm_call_kind", default="other")
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: Tuple, extra: Tuple=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float=1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets) + (math.inf,)
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def summary(self, **labels) -> Tuple[float, float]:
+        """(sum, count) for one label set."""
+        row = self._values.get(_label_key(labels))
+        return (row[-2], row[-1]) if row else (0.0, 0.0)
+
+    def series(self) -> Dict[Tuple, Tuple[float, float]]:
+        with self._lock:
+            return {key: (row[-2], row[-1]) for key, row in self._values.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        lines = []
+        for key, row in items:
+            for bound, count in zip(self.buckets, row):
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {count:g}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {row[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {row[-1]:g}")
+        return lines
+
+
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter(name, help_text))
+
+def gauge(name: str, help_text: str) -> Gauge:
+    return _register(Gauge(name, help_text))
+
+def histogram(name: str, help_text: str, buckets: Tuple=LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, buckets))
+
+
+STAGE_SECONDS = histogram("contract_bot_stage_seconds", "Time spent in pipeline stages")
+HTTP_REQUEST_SECONDS = histogram("contract_bot_http_request_seconds", "HTTP request latency by endpoint")
+LLM_REQUEST_SECONDS = histogram("contract_bot_llm_request_seconds", "LLM provider call latency")
+LLM_ERRORS = counter("contract_bot_llm_errors_total", "Failed LLM provider calls")
+LLM_RETRIES = counter("contract_bot_llm_retries_total", "LLM calls repeated after an unusable reply")
+LLM_TOKENS = counter("contract_bot_llm_tokens_total", "Tokens sent to (in) and generated by (out) LLM providers")
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def provider_for(model: str) -> str:
+    for prefix, provider in (("gpt-", "openai"), ("claude-", "anthropic"), ("gemini-", "gemini"), ("ollama-", "ollama")):
+        if model.startswith(prefix):
+            return provider
+    return "unknown"
+
+def record_tokens(model: str, tokens_in: Optional[int], tokens_out: Optional[int]):
+    provider = provider_for(model)
+    kind = _llm_call_kind.get()
+    if tokens_in:
+        LLM_TOKENS.inc(tokens_in, provider=provider, model=model, kind=kind, direction="in")
+    if tokens_out:
+        LLM_TOKENS.inc(tokens_out, provider=provider, model=model, kind=kind, direction="out")
+
+@contextmanager
+def llm_call_kind(kind: str):
+    """Label the tokens recorded inside the block with kind."""
+    token = _llm_call_kind.set(kind)
+    try:
+        yield
+    finally:
+        _llm_call_kind.reset(token)
+
+
+def start_request_timings() -> contextvars.Token:
+    return _request_timings.set([])
+
+def stop_request_timings(token: contextvars.Token) -> List[Dict]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+def record_request_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append({"stage": name, "seconds": round(seconds, 6)})
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record_request_timing(stage, elapsed)
+
+def instrument(stage: str) -> Callable:
+    """Decorator form of timed()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
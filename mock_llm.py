@@ -0,0 +1,72 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Dict, Optional
+import llm
+
+
+RISK_LEVELS = ["Low", "Medium", "High"]
+
+
+class MockLLM:
+    """Deterministic stand-in for call_ai_model with configurable latency and failure rate.
+
+    Replies depend only on the prompt and seed, so repeated runs produce identical results.
+    """
+
+    def __init__(self, latency: float=0.0, jitter: float=0.0, failure_rate: float=0.0, seed: int=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def __call__(self, prompt: str, model: str="gpt-4", system_message: str="", max_tokens: int=512,
+                 json_schema: Optional[Dict]=None, kind: str="other") -> str:
+        rng = self._rng(prompt)
+        with self._lock:
+            self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)))
+        if rng.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise Exception(f"Error calling {model}: mock provider failure")
+        if json_schema and "items" in json_schema.get("properties", {}):
+            # Translation batch: echo the items back, tagged with the target language
+            target = prompt.split(" into clear, business-friendly ", 1)[-1].split(".", 1)[0]
+            items = json.loads(prompt[prompt.index("Items:") + len("Items:"):])
+            return json.dumps({"items": [dict(item, explanation=f"[{target}] {item['explanation']}",
+                                              suggestion=f"[{target}] {item['suggestion']}") for item in items]})
+        if json_schema:
+            return json.dumps({
+                "explanation": f"Mock analysis of a {len(prompt)} character prompt.",
+                "risk": rng.choice(RISK_LEVELS),
+                "suggestion": "Mock suggestion."
+            })
+        return f"Mock {model} response. " * max(1, min(max_tokens, 400) // 8)
+
+
+_original_call_ai_model = None
+
+def install(mock: MockLLM) -> MockLLM:
+    """Route llm.call_ai_model through the mock until uninstall() is called."""
+    global _original_call_ai_model
+    if _original_call_ai_model is None:
+        _original_call_ai_model = llm.call_ai_model
+    llm.call_ai_model = mock
+    return mock
+
+def uninstall():
+    global _original_call_ai_model
+    if _original_call_ai_model is not None:
+        llm.call_ai_model = _original_call_ai_model
+        _original_call_ai_model = None
@@ -2,8 +2,10 @@ import fitz
 import docx
 import re
 import spacy
-from typing import List
+import io
+from typing import List, Union, BinaryIO
 import nltk
+from metrics import instrument
 
 
 nltk.download("punkt")
@@ -11,27 +13,47 @@ nltk.download("punkt")
 
 nlp = spacy.load("en_core_web_sm")
 
-def extract_text_from_pdf(file_path: str) -> str:
+# A file path, the raw file bytes or a binary stream
+DocumentSource = Union[str, bytes, BinaryIO]
 
-    doc = fitz.open(file_path)
+@instrument("extract_pdf")
+def extract_text_from_pdf(source: DocumentSource) -> str:
+
+    if isinstance(source, str):
+        doc = fitz.open(source)
+    else:
+        data = source if isinstance(source, bytes) else source.read()
+        doc = fitz.open(stream=data, filetype="pdf")
     text_chunks = []
     for page in doc:
         text_chunks.append(page.get_text())
     return "\n".join(text_chunks)
     
 
-def extract_text_from_docx(file_path: str) -> str:
+@instrument("extract_docx")
+def extract_text_from_docx(source: DocumentSource) -> str:
 
-    doc = docx.Document(file_path)
+    doc = docx.Document(io.BytesIO(source) if isinstance(source, bytes) else source)
     text_chunks = [para.text for para in doc.paragraphs]
     return "\n".join(text_chunks)
 
+@instrument("extract_txt")
+def extract_text_from_txt(source: DocumentSource) -> str:
+
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    data = source if isinstance(source, bytes) else source.read()
+    return data.decode('utf-8', errors='ignore')
+
+@instrument("clean_text")
 def clean_text(text: str) -> str:
 
     text = re.sub(r'\s+', ' ', text) 
     text = re.sub(r'\n+', '\n', text)  
     return text.strip()
 
+@instrument("split_into_clauses")
 def split_into_clauses(text: str, max_clause_len: int = 800) -> List[str]:
 
     doc = nlp(text)
@@ -0,0 +1,138 @@
+import contextvars
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import ollama
+from dotenv import load_dotenv
+import metrics
+
+
+load_dotenv()
+
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0"))  # 0 lets the server pick
+# Should match the server's own OLLAMA_NUM_PARALLEL, extra requests only queue server-side
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "").split(",") if m.strip()]
+
+
+class OllamaBackend:
+    """Local Ollama serving: warm models, fixed runtime options and bounded parallel requests."""
+
+    def __init__(self, host: str=OLLAMA_HOST, keep_alive: str=OLLAMA_KEEP_ALIVE, num_ctx: int=OLLAMA_NUM_CTX,
+                 num_thread: int=OLLAMA_NUM_THREAD, num_parallel: int=OLLAMA_NUM_PARALLEL):
+        self.host = host
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.num_thread = num_thread
+        self.num_parallel = max(1, num_parallel)
+        self.client = ollama.Client(host=host)
+        self._slots = threading.BoundedSemaphore(self.num_parallel)
+
+    def options(self, max_tokens: Optional[int]=None) -> Dict:
+        opts = {"temperature": 0.0, "num_ctx": self.num_ctx}
+        if self.num_thread:
+            opts["num_thread"] = self.num_thread
+        if max_tokens:
+            opts["num_predict"] = max_tokens
+        return opts
+
+    def chat(self, model_name: str, prompt: str, system_message: str="", max_tokens: Optional[int]=None,
+             json_mode: bool=False) -> str:
+        # A separate system message keeps the prompt prefix stable so the server can reuse its KV cache
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "user", "content": prompt})
+        with self._slots:
+            response = self.client.chat(
+                model=model_name,
+                messages=messages,
+                format="json" if json_mode else None,
+                options=self.options(max_tokens),
+                keep_alive=self.keep_alive
+            )
+        metrics.record_tokens(f"ollama-{model_name}", response.get("prompt_eval_count"), response.get("eval_count"))
+        return response["message"]["content"].strip()
+
+    def map(self, fn: Callable, items: List) -> List:
+        """Run fn over items with at most num_parallel requests in flight, preserving order."""
+        if self.num_parallel == 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        # Each task runs in a copy of the caller's context so per-request timings follow it
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=min(self.num_parallel, len(items))) as pool:
+            return list(pool.map(lambda item: context.copy().run(fn, item), items))
+
+    def warmup(self, models: List[str]) -> Dict[str, str]:
+        """Load models into memory and pin them for keep_alive. Returns a status per model."""
+        status = {}
+        for model_name in models:
+            model_name = model_name.replace("ollama-", "", 1)
+            try:
+                # An empty prompt loads the model without generating anything
+                self.client.generate(model=model_name, prompt="", options=self.options(), keep_alive=self.keep_alive)
+                status[model_name] = "warm"
+            except Exception as e:
+                status[model_name] = f"error: {str(e)}"
+        return status
+
+    def health(self) -> Dict:
+        try:
+            installed = [m.get("model") or m.get("name") for m in self.client.list()["models"]]
+            loaded = [m.get("model") or m.get("name") for m in self.client.ps()["models"]]
+        except Exception as e:
+            return {"ok": False, "host": self.host, "error": str(e)}
+        return {
+            "ok": True,
+            "host": self.host,
+            "installed": installed,
+            "loaded": loaded,
+            "num_parallel": self.num_parallel,
+            "keep_alive": self.keep_alive
+        }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_ollama_backend() -> OllamaBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = OllamaBackend()
+    return _backend
+
+
+def main():
+    """Usage: python ollama_backend.py health | warmup [model ...]"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "health"
+    backend = get_ollama_backend()
+    if command == "health":
+        info = backend.health()
+        if not info["ok"]:
+            print(f"❌ Ollama not reachable at {info['host']}: {info['error']}")
+            sys.exit(1)
+        print(f"✅ Ollama reachable at {info['host']}")
+        print(f"📦 Installed: {', '.join(info['installed']) or 'none'}")
+        print(f"🔥 Loaded: {', '.join(info['loaded']) or 'none'}")
+        print(f"⚙️  Parallel requests: {info['num_parallel']}, keep_alive: {info['keep_alive']}")
+    elif command == "warmup":
+        models = sys.argv[2:] or OLLAMA_WARM_MODELS
+        if not models:
+            print("❌ No models given. Pass model names or set OLLAMA_WARM_MODELS")
+            sys.exit(1)
+        for model_name, state in backend.warmup(models).items():
+            print(f"{'✅' if state == 'warm' else '❌'} {model_name}: {state}")
+    else:
+        print(main.__doc__)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
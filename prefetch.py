@@ -0,0 +1,168 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from llm import analyze_clauses
+from scoring import overall_risk_score
+from store import get_store, has_failed_results
+from clause_index import get_clause_index, CLAUSE_INDEX_ENABLED
+from scheduler import get_request_class, set_request_class
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+# Opt-in: start analysing the default model/language as soon as a contract is uploaded
+SPECULATIVE_ANALYSIS = os.getenv("SPECULATIVE_ANALYSIS", "0") == "1"
+SPECULATIVE_MODEL = os.getenv("SPECULATIVE_MODEL", "gpt-4")
+SPECULATIVE_LANGUAGE = os.getenv("SPECULATIVE_LANGUAGE", "English")
+# The UI lets users pick up to 12 clauses
+SPECULATIVE_MAX_CLAUSES = int(os.getenv("SPECULATIVE_MAX_CLAUSES", "12"))
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", "2"))
+# Jobs nobody has attached to for this long are treated as abandoned and stop before their next batch
+SPECULATIVE_TTL = float(os.getenv("SPECULATIVE_TTL", "120"))
+
+JobKey = Tuple[str, str, str]
+
+
+class PrefetchJob:
+    """Background clause analysis for one (document, model, language), consumable while it runs."""
+
+    def __init__(self, key: JobKey, text: str, split_fn: Callable[[str, str], List[str]], max_clauses: int,
+                 ttl: float=SPECULATIVE_TTL):
+        self.key = key
+        self.text = text
+        self.split_fn = split_fn
+        self.max_clauses = max_clauses
+        self.ttl = ttl
+        self.clauses: Optional[List[str]] = None
+        self.results: List[Dict] = []
+        self.owners = set()
+        self.touched = time.monotonic()
+        self.waiters = 0
+        self.done = False
+        self.cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    def run(self):
+        doc_hash, model, language = self.key
+        try:
+            self.clauses = self.split_fn(doc_hash, self.text)[:self.max_clauses]
+            # Local models analyse several clauses at once, cloud models one at a time
+            step = 1
+            if model.startswith("ollama-"):
+                from ollama_backend import get_ollama_backend
+                step = get_ollama_backend().num_parallel
+            for start in range(0, len(self.clauses), step):
+                # Abandoned sessions never call /reset or upload again, so the job checks its own idle time
+                if not self.waiters and time.monotonic() - self.touched > self.ttl:
+                    self.cancelled.set()
+                if self.cancelled.is_set():
+                    return
+                batch = analyze_clauses(self.clauses[start:start + step], model=model, language=language)
+                with self._cond:
+                    self.results.extend(batch)
+                    self._cond.notify_all()
+            if has_failed_results(self.results):
+                return
+            get_store().save_analysis(doc_hash, model, language, self.results, overall_risk_score(self.results))
+            if CLAUSE_INDEX_ENABLED:
+                get_clause_index().add_analysis_async(doc_hash, self.results, model, language)
+        except Exception:
+            logger.exception("Speculative analysis of %s with %s failed", doc_hash, model)
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def wait(self, count: int) -> List[Dict]:
+        """Block until the first count results exist or the job stops; may return fewer if cancelled."""
+        with self._cond:
+            self.waiters += 1
+            try:
+                self._cond.wait_for(lambda: self.done or len(self.results) >= count)
+            finally:
+                self.waiters -= 1
+                self.touched = time.monotonic()
+            return list(self.results[:count])
+
+    def covers(self, clauses: List[str]) -> bool:
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or self.clauses is not None)
+        return self.clauses is not None and self.clauses[:len(clauses)] == clauses
+
+
+class Prefetcher:
+
+    def __init__(self, workers: int=SPECULATIVE_WORKERS, ttl: float=SPECULATIVE_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._jobs: Dict[JobKey, PrefetchJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, owner: str, doc_hash: str, text: str, split_fn: Callable[[str, str], List[str]],
+              model: str=SPECULATIVE_MODEL, language: str=SPECULATIVE_LANGUAGE,
+              max_clauses: int=SPECULATIVE_MAX_CLAUSES) -> PrefetchJob:
+        key = (doc_hash, model, language)
+        self.sweep()
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.cancelled.is_set():
+                job = self._jobs[key] = PrefetchJob(key, text, split_fn, max_clauses, self.ttl)
+                # Executor threads start with an empty context: charge the uploader's user and tenant,
+                # at a priority below real /analyze traffic
+                user, tenant, _ = get_request_class()
+                context = contextvars.copy_context()
+                context.run(set_request_class, user, tenant, "speculative")
+                self._executor.submit(context.run, job.run)
+            job.owners.add(owner)
+            job.touched = time.monotonic()
+        return job
+
+    def attach(self, owner: str, doc_hash: str, model: str, language: str) -> Optional[PrefetchJob]:
+        with self._lock:
+            job = self._jobs.get((doc_hash, model, language))
+            if job is None or job.cancelled.is_set():
+                return None
+            job.owners.add(owner)
+            job.touched = time.monotonic()
+            return job
+
+    def release(self, owner: str):
+        """Drop owner's interest; jobs nobody else wants are cancelled."""
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                job.owners.discard(owner)
+                if not job.owners:
+                    self._cancel(key)
+
+    def sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                if (job.done or job.cancelled.is_set()) and now - job.touched > self.ttl:
+                    del self._jobs[key]
+                elif not job.done and now - job.touched > self.ttl:
+                    self._cancel(key)
+
+    def _cancel(self, key: JobKey):
+        job = self._jobs.pop(key)
+        job.cancelled.set()
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher()
+    return _prefetcher
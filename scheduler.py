@@ -0,0 +1,156 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+import metrics
+
+
+load_dotenv()
+
+
+# Provider calls allowed in flight across the whole process
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+SCHEDULER_USER_LIMIT = int(os.getenv("SCHEDULER_USER_LIMIT", "4"))
+SCHEDULER_TENANT_LIMIT = int(os.getenv("SCHEDULER_TENANT_LIMIT", "6"))
+# JSON object of tenant -> weight for fair sharing, e.g. {"legal-team": 2}; unlisted tenants weigh 1
+SCHEDULER_TENANT_WEIGHTS = json.loads(os.getenv("SCHEDULER_TENANT_WEIGHTS", "{}"))
+
+# Lower value is served first; speculative analysis started at upload only uses otherwise idle slots
+PRIORITIES = {"interactive": 0, "bulk": 1, "speculative": 2}
+
+QUEUE_DEPTH = metrics.gauge("contract_bot_scheduler_queue_depth", "LLM calls waiting for a scheduler slot")
+IN_FLIGHT = metrics.gauge("contract_bot_scheduler_in_flight", "LLM calls holding a scheduler slot")
+WAIT_SECONDS = metrics.histogram("contract_bot_scheduler_wait_seconds", "Time LLM calls waited for a scheduler slot")
+
+# (user, tenant, priority) of the work running in this context
+_request_class = contextvars.ContextVar("request_class", default=("background", "default", "bulk"))
+
+
+def set_request_class(user: str, tenant: str, priority: str) -> contextvars.Token:
+    return _request_class.set((user, tenant, priority if priority in PRIORITIES else "bulk"))
+
+def reset_request_class(token: contextvars.Token):
+    _request_class.reset(token)
+
+def get_request_class():
+    """(user, tenant, priority) of the work running in this context"""
+    return _request_class.get()
+
+
+class _Ticket:
+    __slots__ = ("user", "tenant", "priority", "finish_tag", "seq", "enqueued", "granted")
+
+    def __init__(self, user: str, tenant: str, priority: str, finish_tag: float, seq: int):
+        self.user = user
+        self.tenant = tenant
+        self.priority = priority
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class Scheduler:
+    """Process-wide gate for provider calls.
+
+    Calls are admitted by priority class, then by weighted fair queuing across tenants
+    (start-time fair queuing with unit cost), subject to global, per-tenant and per-user limits.
+    """
+
+    def __init__(self, max_concurrency: int=SCHEDULER_MAX_CONCURRENCY, user_limit: int=SCHEDULER_USER_LIMIT,
+                 tenant_limit: int=SCHEDULER_TENANT_LIMIT, tenant_weights: Optional[Dict[str, float]]=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.user_limit = max(1, user_limit)
+        self.tenant_limit = max(1, tenant_limit)
+        self.tenant_weights = tenant_weights if tenant_weights is not None else SCHEDULER_TENANT_WEIGHTS
+        self._cond = threading.Condition()
+        self._waiting: List[_Ticket] = []
+        self._running = 0
+        self._running_users: Dict[str, int] = {}
+        self._running_tenants: Dict[str, int] = {}
+        self._tenant_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = 0
+
+    def _eligible(self, ticket: _Ticket) -> bool:
+        return (self._running_users.get(ticket.user, 0) < self.user_limit
+                and self._running_tenants.get(ticket.tenant, 0) < self.tenant_limit)
+
+    def _dispatch(self):
+        # Called with the condition held: grant slots to the best eligible waiters
+        while self._running < self.max_concurrency:
+            candidates = [t for t in self._waiting if self._eligible(t)]
+            if not candidates:
+                break
+            ticket = min(candidates, key=lambda t: (PRIORITIES[t.priority], t.finish_tag, t.seq))
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._virtual_time = max(self._virtual_time, ticket.finish_tag - self._cost(ticket.tenant))
+            self._running += 1
+            self._running_users[ticket.user] = self._running_users.get(ticket.user, 0) + 1
+            self._running_tenants[ticket.tenant] = self._running_tenants.get(ticket.tenant, 0) + 1
+        self._cond.notify_all()
+        self._publish()
+
+    def _cost(self, tenant: str) -> float:
+        return 1.0 / max(float(self.tenant_weights.get(tenant, 1.0)), 1e-6)
+
+    def _publish(self):
+        for priority in PRIORITIES:
+            QUEUE_DEPTH.set(sum(1 for t in self._waiting if t.priority == priority), priority=priority)
+        IN_FLIGHT.set(self._running)
+
+    @contextmanager
+    def slot(self, user: Optional[str]=None, tenant: Optional[str]=None, priority: Optional[str]=None):
+        """Hold one provider-call slot for the duration of the block. Defaults come from the request class."""
+        default_user, default_tenant, default_priority = _request_class.get()
+        user = user or default_user
+        tenant = tenant or default_tenant
+        priority = priority if priority in PRIORITIES else default_priority
+        with self._cond:
+            self._seq += 1
+            start_tag = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+            ticket = _Ticket(user, tenant, priority, start_tag + self._cost(tenant), self._seq)
+            self._tenant_finish[tenant] = ticket.finish_tag
+            self._waiting.append(ticket)
+            self._dispatch()
+            self._cond.wait_for(lambda: ticket.granted)
+        WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued, priority=priority)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._running_users[user] -= 1
+                if not self._running_users[user]:
+                    del self._running_users[user]
+                self._running_tenants[tenant] -= 1
+                if not self._running_tenants[tenant]:
+                    del self._running_tenants[tenant]
+                self._dispatch()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "in_flight": self._running,
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": {p: sum(1 for t in self._waiting if t.priority == p) for p in PRIORITIES},
+                "oldest_wait_seconds": round(max((now - t.enqueued for t in self._waiting), default=0.0), 3)
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler()
+    return _scheduler
@@ -1,16 +1,129 @@
+import json
+import os
+import re
+from typing import List, Dict, Optional
+from dotenv import load_dotenv
+
+
+load_dotenv()
 
-from typing import List, Dict
 
 RISK_MAP = {"Low": 1, "Medium": 2, "High": 3}
+MAX_RISK = max(RISK_MAP.values())
+
+DEFAULT_CATEGORY = "general"
+
+# Keyword patterns per category, checked against the lower-cased clause text
+CATEGORY_KEYWORDS = {
+    "liability": [r"liabilit", r"liable", r"consequential damages", r"limitation of", r"cap on", r"aggregate amount",
+                  r"indirect damages", r"loss of profits?"],
+    "indemnity": [r"indemnif", r"indemnit", r"hold harmless", r"defend and", r"third[- ]party claims?"],
+    "termination": [r"terminat", r"expir", r"renewal", r"notice of non-renewal", r"cancel", r"wind[- ]down"],
+    "payment": [r"payment", r"fees?\b", r"invoice", r"price", r"compensation", r"interest", r"late charge",
+                r"reimburs", r"taxes", r"royalt"],
+    "intellectual_property": [r"intellectual property", r"copyright", r"patent", r"trademark", r"trade secret",
+                              r"licen[cs]e", r"work product", r"ownership", r"moral rights"],
+    "confidentiality": [r"confidential", r"non-disclosure", r"disclos", r"proprietary information", r"personal data",
+                        r"data protection", r"privacy"],
+    "dispute_resolution": [r"arbitrat", r"governing law", r"jurisdiction", r"dispute", r"venue", r"mediat",
+                           r"injunctive relief", r"courts? of"],
+    "warranty": [r"warrant", r"represent", r"as is", r"fitness for a particular purpose", r"merchantab"],
+    "non_compete": [r"non-compet", r"non-solicit", r"restrictive covenant", r"exclusiv"],
+    "force_majeure": [r"force majeure", r"act of god", r"beyond (?:its|their|the) reasonable control"],
+    "assignment": [r"assign", r"subcontract", r"change of control", r"successors"],
+    "notices": [r"notices?\b", r"in writing to", r"registered mail", r"address"],
+}
+CATEGORY_PATTERNS = {category: re.compile("|".join(keywords)) for category, keywords in CATEGORY_KEYWORDS.items()}
+
+# How much a clause of each category counts towards the contract score; unlisted categories weigh 1
+DEFAULT_CATEGORY_WEIGHTS = {
+    "liability": 3.0,
+    "indemnity": 3.0,
+    "intellectual_property": 2.5,
+    "termination": 2.0,
+    "payment": 2.0,
+    "confidentiality": 2.0,
+    "dispute_resolution": 1.5,
+    "non_compete": 1.5,
+    "warranty": 1.5,
+    "assignment": 1.0,
+    "force_majeure": 1.0,
+    "notices": 0.5,
+    DEFAULT_CATEGORY: 1.0,
+}
+# JSON object overriding individual weights, e.g. {"payment": 3, "notices": 0.25}
+CATEGORY_WEIGHTS = dict(DEFAULT_CATEGORY_WEIGHTS, **json.loads(os.getenv("SCORING_CATEGORY_WEIGHTS", "{}")))
+# Share of the score taken by the single worst clause (0 = plain weighted mean, 1 = worst clause only)
+SCORING_MAX_WEIGHT = float(os.getenv("SCORING_MAX_WEIGHT", "0.4"))
+
 
 def clause_risk_score(risk_label: str) -> int:
     return RISK_MAP.get(risk_label, 2)
 
+def categorize_clause(text: str) -> str:
+    """Category with the most keyword hits, or 'general' when none match"""
+    text = text.lower()
+    best, best_hits = DEFAULT_CATEGORY, 0
+    for category, pattern in CATEGORY_PATTERNS.items():
+        hits = len(pattern.findall(text))
+        if hits > best_hits:
+            best, best_hits = category, hits
+    return best
+
+def tag_clauses(clauses: List[Dict]) -> List[Dict]:
+    """Add a 'category' to analysis results that do not have one yet"""
+    for c in clauses:
+        if not c.get('category'):
+            c['category'] = categorize_clause(c.get('clause', ''))
+    return clauses
+
+def contract_score(clauses: List[Dict], weights: Optional[Dict[str, float]]=None,
+                   max_weight: Optional[float]=None) -> Dict:
+    """Weighted, max-aware contract score (0-100) with a subscore per category.
+
+    The weighted mean keeps important categories from being diluted by boilerplate; blending in
+    the worst clause (scaled by its category weight, capped at 1) keeps a single high-risk
+    indemnity or liability clause visible however many harmless clauses surround it.
+    """
+    if not clauses:
+        return {"score": 0.0, "weighted_mean": 0.0, "peak": 0.0, "categories": {}}
+    weights = CATEGORY_WEIGHTS if weights is None else weights
+    max_weight = SCORING_MAX_WEIGHT if max_weight is None else min(max(max_weight, 0.0), 1.0)
+
+    total = max_total = peak = 0.0
+    categories: Dict[str, Dict] = {}
+    for c in clauses:
+        category = c.get('category') or categorize_clause(c.get('clause', ''))
+        risk = clause_risk_score(c.get('risk', 'Medium'))
+        weight = weights.get(category, 1.0)
+        total += weight * risk
+        max_total += weight * MAX_RISK
+        peak = max(peak, risk / MAX_RISK * min(weight, 1.0))
+
+        sub = categories.setdefault(category, {"clauses": 0, "total": 0, "max_risk": 0, "weight": weight})
+        sub["clauses"] += 1
+        sub["total"] += risk
+        sub["max_risk"] = max(sub["max_risk"], risk)
+
+    weighted_mean = total / max_total * 100 if max_total else 0.0
+    labels = {v: k for k, v in RISK_MAP.items()}
+    return {
+        "score": round((1 - max_weight) * weighted_mean + max_weight * peak * 100, 1),
+        "weighted_mean": round(weighted_mean, 1),
+        "peak": round(peak * 100, 1),
+        "categories": {
+            category: {
+                "score": round(sub["total"] / (sub["clauses"] * MAX_RISK) * 100, 1),
+                "clauses": sub["clauses"],
+                "max_risk": labels[sub["max_risk"]],
+                "weight": sub["weight"]
+            }
+            for category, sub in sorted(categories.items(), key=lambda item: -item[1]["total"] / item[1]["clauses"])
+        }
+    }
+
 def overall_risk_score(clauses: List[Dict]) -> float:
 
     if not clauses:
         return 0.0
-    total = sum(clause_risk_score(c.get('risk','Medium')) for c in clauses)
-    max_total = len(clauses) * 3
-    score = (total / max_total) * 100
-    return round(score,1)
+    return contract_score(clauses)["score"]
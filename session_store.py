@@ -0,0 +1,89 @@
+import secrets
+import time
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from store import get_store
+
+
+# Expired sessions are deleted at most this often
+SESSION_PRUNE_INTERVAL = 600
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid: str="", new: bool=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+
+    # Reads are tracked like flask's cookie session, so only responses that used the session vary on it
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class StoreSessionInterface(SessionInterface):
+    """Keeps session data in the document store; the cookie only carries a signed session id.
+
+    Contract text and analysis results stay out of the cookie, which otherwise hits the
+    browser's 4 KB limit on any multilingual analysis.
+    """
+
+    def __init__(self):
+        self._last_prune = 0.0
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt="server-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("ascii")
+            except BadSignature:
+                sid = None
+            if sid:
+                data = get_store().get_session(sid, app.permanent_session_lifetime.total_seconds())
+                if data is not None:
+                    return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed or session.modified:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and not session.new:
+                get_store().delete_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified:
+            get_store().save_session(session.sid, dict(session))
+            self._prune(app)
+        if self.should_set_cookie(app, session):
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode("ascii"),
+                                expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+    def _prune(self, app):
+        now = time.time()
+        if now - self._last_prune > SESSION_PRUNE_INTERVAL:
+            self._last_prune = now
+            get_store().prune_sessions(app.permanent_session_lifetime.total_seconds())
@@ -54,6 +54,22 @@ def install_ollama_models():
     
     return True
 
+def warm_ollama_models():
+    """Load the models listed in OLLAMA_WARM_MODELS so the first analysis does not pay the load time"""
+    from ollama_backend import get_ollama_backend, OLLAMA_WARM_MODELS
+    
+    backend = get_ollama_backend()
+    health = backend.health()
+    if not health["ok"]:
+        print(f"⚠️  Ollama server not reachable at {health['host']}, skipping warmup")
+        return False
+    if not OLLAMA_WARM_MODELS:
+        print("💡 Set OLLAMA_WARM_MODELS in .env to keep local models loaded between analyses")
+        return True
+    for model, state in backend.warmup(OLLAMA_WARM_MODELS).items():
+        print(f"{'✅' if state == 'warm' else '❌'} {model}: {state}")
+    return True
+
 def check_api_keys():
     """Check if API keys are configured"""
     from dotenv import load_dotenv
@@ -90,7 +106,8 @@ def main():
     
     # Check and install Ollama models
     print("\n📦 Setting up Ollama models...")
-    install_ollama_models()
+    if install_ollama_models():
+        warm_ollama_models()
     
     # Check API keys
     check_api_keys()
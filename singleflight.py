@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within the process
+    fcntl = None
+
+
+load_dotenv()
+
+
+# Set to a directory shared by all workers on the host to also coalesce across processes
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", "")
+# Per-key lock and result files older than this are deleted; results are never reused as a cache
+SINGLEFLIGHT_FILE_TTL = float(os.getenv("SINGLEFLIGHT_FILE_TTL", "60"))
+# The lock directory is scanned for old files at most this often
+SINGLEFLIGHT_PRUNE_INTERVAL = 60
+
+COALESCED_CALLS = metrics.counter("contract_bot_singleflight_total", "LLM calls by single-flight role (leader runs, others share)")
+
+
+def flight_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self, lock_dir: str=SINGLEFLIGHT_LOCK_DIR, file_ttl: float=SINGLEFLIGHT_FILE_TTL):
+        self.lock_dir = lock_dir if fcntl is not None else ""
+        self.file_ttl = file_ttl
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, fn: Callable[[], Any], kind: str="call") -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            COALESCED_CALLS.inc(kind=kind, role="shared")
+            return future.result()
+
+        try:
+            result = self._run_across_processes(key, fn, kind) if self.lock_dir else fn()
+            if not self.lock_dir:
+                COALESCED_CALLS.inc(kind=kind, role="leader")
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _run_across_processes(self, key: str, fn: Callable[[], Any], kind: str) -> Any:
+        # The in-process leader takes a per-key file lock. A result left by whoever held the lock is only
+        # shared when it was written while we waited, so this coalesces concurrent calls but never caches
+        result_path = os.path.join(self.lock_dir, f"{key}.json")
+        waiting_since = time.time()
+        try:
+            with open(os.path.join(self.lock_dir, f"{key}.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    shared = self._read_result(result_path, waiting_since)
+                    if shared is not None:
+                        COALESCED_CALLS.inc(kind=kind, role="shared_process")
+                        return shared["value"]
+                    result = fn()
+                    COALESCED_CALLS.inc(kind=kind, role="leader")
+                    tmp_path = f"{result_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump({"value": result}, f, ensure_ascii=False)
+                    os.replace(tmp_path, result_path)
+                    return result
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self._prune()
+
+    def _read_result(self, path: str, written_after: float) -> Optional[Dict]:
+        try:
+            if os.path.getmtime(path) < written_after:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self):
+        """Delete lock and result files older than file_ttl, at most once per SINGLEFLIGHT_PRUNE_INTERVAL"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < SINGLEFLIGHT_PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        for entry in os.scandir(self.lock_dir):
+            try:
+                if now - entry.stat().st_mtime <= self.file_ttl:
+                    continue
+                if entry.name.endswith(".lock"):
+                    # Keep locks that are held by a call still running in some worker
+                    with open(entry.path, "a") as lock_file:
+                        try:
+                            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue
+                        os.remove(entry.path)
+                else:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+def get_singleflight() -> SingleFlight:
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                _flight = SingleFlight()
+    return _flight
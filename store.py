@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from codec import decode, encode
+
+
+load_dotenv()
+
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", os.path.join(DATA_DIR, "documents.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    text BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    counterparty TEXT,
+    contract_type TEXT
+);
+CREATE TABLE IF NOT EXISTS clauses (
+    doc_hash TEXT NOT NULL,
+    max_clause_len INTEGER NOT NULL,
+    clauses BLOB NOT NULL,
+    PRIMARY KEY (doc_hash, max_clause_len)
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    doc_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    language TEXT NOT NULL,
+    results BLOB NOT NULL,
+    analyzed_clauses INTEGER NOT NULL,
+    overall_score REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (doc_hash, model, language)
+);
+CREATE TABLE IF NOT EXISTS clause_results (
+    doc_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    language TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    risk TEXT NOT NULL,
+    category TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (doc_hash, model, language, idx)
+);
+CREATE INDEX IF NOT EXISTS clause_results_created ON clause_results (created_at);
+CREATE TABLE IF NOT EXISTS translations (
+    result_hash TEXT NOT NULL,
+    language TEXT NOT NULL,
+    model TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (result_hash, language)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+"""
+
+
+def has_failed_results(results: List[Dict]) -> bool:
+    """True when any clause analysis failed; such analyses are neither stored nor reused."""
+    return any(r.get("error") for r in results)
+
+
+class DocumentStore:
+    """Extracted text, clause splits and analyses keyed by the SHA-256 of the uploaded file.
+
+    Text, clause lists and results are stored as compact encoded records (see codec.py).
+    """
+
+    def __init__(self, path: str=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_document(self, doc_hash: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()
+        if not row:
+            return None
+        document = dict(row)
+        document["text"] = decode(document["text"])
+        return document
+
+    def save_document(self, doc_hash: str, filename: str, text: str, counterparty: Optional[str]=None,
+                      contract_type: Optional[str]=None):
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO documents (doc_hash, filename, text, created_at, counterparty, contract_type) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (doc_hash, filename, encode(text), time.time(), counterparty, contract_type))
+
+    def update_document_metadata(self, doc_hash: str, counterparty: Optional[str]=None, contract_type: Optional[str]=None):
+        with self._conn() as conn:
+            conn.execute("UPDATE documents SET counterparty = COALESCE(?, counterparty), "
+                         "contract_type = COALESCE(?, contract_type) WHERE doc_hash = ?",
+                         (counterparty, contract_type, doc_hash))
+
+    def get_clauses(self, doc_hash: str, max_clause_len: int) -> Optional[List[str]]:
+        row = self._conn().execute("SELECT clauses FROM clauses WHERE doc_hash = ? AND max_clause_len = ?",
+                                   (doc_hash, max_clause_len)).fetchone()
+        return decode(row["clauses"]) if row else None
+
+    def save_clauses(self, doc_hash: str, max_clause_len: int, clauses: List[str]):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO clauses (doc_hash, max_clause_len, clauses) VALUES (?, ?, ?)",
+                         (doc_hash, max_clause_len, encode(clauses)))
+
+    def get_analysis(self, doc_hash: str, model: str, language: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM analyses WHERE doc_hash = ? AND model = ? AND language = ?",
+                                   (doc_hash, model, language)).fetchone()
+        if not row:
+            return None
+        analysis = dict(row)
+        analysis["results"] = decode(analysis["results"])
+        return None if has_failed_results(analysis["results"]) else analysis
+
+    def save_analysis(self, doc_hash: str, model: str, language: str, results: List[Dict], overall_score: float):
+        if has_failed_results(results):
+            return
+        with self._conn() as conn:
+            existing = conn.execute("SELECT analyzed_clauses FROM analyses WHERE doc_hash = ? AND model = ? AND language = ?",
+                                    (doc_hash, model, language)).fetchone()
+            # Never replace a longer analysis with a shorter one
+            if existing and existing["analyzed_clauses"] > len(results):
+                return
+            created_at = time.time()
+            conn.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (doc_hash, model, language, encode(results), len(results),
+                          overall_score, created_at))
+            # One flat row per clause for portfolio analytics
+            conn.execute("DELETE FROM clause_results WHERE doc_hash = ? AND model = ? AND language = ?",
+                         (doc_hash, model, language))
+            conn.executemany("INSERT INTO clause_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(doc_hash, model, language, i, r.get("risk", "Medium"),
+                               r.get("category") or "uncategorized", created_at)
+                              for i, r in enumerate(results)])
+
+    def get_translations(self, result_hashes, language: str) -> Dict[str, Dict]:
+        result_hashes = list(result_hashes)
+        found = {}
+        # Stay under sqlite's bound-parameter limit
+        for start in range(0, len(result_hashes), 500):
+            chunk = result_hashes[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT result_hash, data FROM translations WHERE language = ? "
+                f"AND result_hash IN ({','.join('?' * len(chunk))})", [language] + chunk).fetchall()
+            found.update({row["result_hash"]: decode(row["data"]) for row in rows})
+        return found
+
+    def save_translations(self, language: str, model: str, translations: Dict[str, Dict]):
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                             [(result_hash, language, model,
+                               encode({"explanation": t["explanation"], "suggestion": t["suggestion"]}))
+                              for result_hash, t in translations.items()])
+
+    def get_session(self, session_id: str, max_age: float) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if not row or time.time() - row["updated_at"] > max_age:
+            return None
+        return decode(row["data"])
+
+    def save_session(self, session_id: str, data: Dict):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, encode(data), time.time()))
+
+    def delete_session(self, session_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def prune_sessions(self, max_age: float):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, for read-only analytics queries"""
+        return self._conn()
+
+    def iter_analyses(self):
+        """Every stored analysis, oldest first"""
+        for row in self._conn().execute("SELECT * FROM analyses ORDER BY created_at"):
+            analysis = dict(row)
+            analysis["results"] = decode(analysis["results"])
+            if not has_failed_results(analysis["results"]):
+                yield analysis
+
+    def list_analyses(self, doc_hash: str) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT model, language, analyzed_clauses, overall_score, created_at FROM analyses WHERE doc_hash = ? "
+            "ORDER BY created_at DESC", (doc_hash,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> DocumentStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore()
+    return _store
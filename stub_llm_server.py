@@ -0,0 +1,131 @@
+import argparse
+import json
+import random
+import time
+import uuid
+from typing import Dict, Tuple
+from fake_ollama import FAKE_ANALYSIS, FAKE_MODELS, FakeOllamaHandler, start_fake_ollama
+
+
+FAKE_SUMMARY = "This is a stub summary of the contract. " * 20
+
+
+class StubLLMHandler(FakeOllamaHandler):
+    """Fake Ollama plus OpenAI /v1/chat/completions and Anthropic /v1/messages, for load tests.
+
+    Point the app at it with OPENAI_BASE_URL=<url>/v1, ANTHROPIC_BASE_URL=<url> and OLLAMA_HOST=<url>.
+    """
+
+    server_version = "StubLLM/0.1"
+    # Keep-alive, so client connection pools are exercised as against a real provider
+    protocol_version = "HTTP/1.1"
+
+    def _delay(self) -> bool:
+        """Sleep for the configured latency; False when this call should fail instead."""
+        server = self.server
+        latency = max(0.0, server.latency + random.uniform(-server.jitter, server.jitter))
+        if latency:
+            time.sleep(latency)
+        ok = random.random() >= server.error_rate
+        with server.lock:
+            server.requests += 1
+            server.errors += not ok
+        return ok
+
+    def _structured(self, prompt: str) -> Dict:
+        # Translation batches carry their items as JSON after "Items:", everything else is a clause analysis
+        if "Items:" in prompt:
+            items = json.loads(prompt[prompt.index("Items:") + len("Items:"):])
+            return {"items": [dict(item, explanation=f"[translated] {item['explanation']}") for item in items]}
+        return dict(FAKE_ANALYSIS, confidence=0.9)
+
+    def do_GET(self):
+        if self.path == "/stub/stats":
+            with self.server.lock:
+                self._send_json({"requests": self.server.requests, "errors": self.server.errors})
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        if self.path == "/v1/chat/completions":
+            self._openai_chat()
+        elif self.path == "/v1/messages":
+            self._anthropic_messages()
+        else:
+            super().do_POST()
+
+    def _openai_chat(self):
+        request = self._read_json()
+        if not self._delay():
+            self._send_json({"error": {"message": "stub overloaded", "type": "server_error"}}, 503)
+            return
+        prompt = request["messages"][-1]["content"]
+        structured = request.get("response_format") or "JSON" in prompt
+        text = json.dumps(self._structured(prompt)) if structured else FAKE_SUMMARY
+        self._send_json({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                      "total_tokens": (len(prompt) + len(text)) // 4}
+        })
+
+    def _anthropic_messages(self):
+        request = self._read_json()
+        if not self._delay():
+            self._send_json({"type": "error", "error": {"type": "overloaded_error", "message": "stub overloaded"}}, 529)
+            return
+        prompt = request["messages"][-1]["content"]
+        if request.get("tools"):
+            tool = request["tools"][0]
+            content = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool["name"],
+                        "input": self._structured(prompt)}]
+            output = json.dumps(content[0]["input"])
+        else:
+            content = [{"type": "text", "text": FAKE_SUMMARY}]
+            output = FAKE_SUMMARY
+        self._send_json({
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", ""),
+            "content": content,
+            "stop_reason": "tool_use" if request.get("tools") else "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(output) // 4}
+        })
+
+
+def start_stub_llm(port: int=0, latency: float=0.0, jitter: float=0.0, error_rate: float=0.0,
+                   models=FAKE_MODELS) -> Tuple[object, str]:
+    """Start the stub in a daemon thread; returns (server, base_url)."""
+    server, url = start_fake_ollama(port, latency, models, handler=StubLLMHandler)
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.errors = 0
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI/Anthropic/Ollama server for load tests")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of completions answered with 5xx")
+    args = parser.parse_args()
+
+    server, url = start_stub_llm(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"🧪 Stub LLM listening on {url} (OPENAI_BASE_URL={url}/v1 ANTHROPIC_BASE_URL={url} OLLAMA_HOST={url})",
+          flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+import metrics
+from llm import build_clause_prompt, CLAUSE_MAX_TOKENS, TRIAGE_PROMPT_SUFFIX
+
+try:
+    import tiktoken
+except ImportError:  # optional, the heuristic below is used instead
+    tiktoken = None
+
+
+# USD per 1K tokens (input, output); local models cost nothing per call
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "claude-3-opus": (0.015, 0.075),
+    "claude-3-sonnet": (0.003, 0.015),
+    "claude-3-haiku": (0.00025, 0.00125),
+    "gemini-2.0-flash": (0.0001, 0.0004),
+    "gemini-pro": (0.0005, 0.0015),
+}
+
+# Tokenizers of other providers split text a little differently from OpenAI's cl100k
+PROVIDER_TOKEN_FACTOR = {"openai": 1.0, "anthropic": 1.1, "gemini": 1.0, "ollama": 1.05, "unknown": 1.1}
+
+# Typical size of a clause analysis reply, used until real usage has been observed
+DEFAULT_OUTPUT_TOKENS = {"English": 350, "Hindi": 700, "Tamil": 800}
+
+# Seconds per clause call before any latency has been observed
+DEFAULT_SECONDS_PER_CALL = {"openai": 12.0, "anthropic": 8.0, "gemini": 4.0, "ollama": 20.0, "unknown": 10.0}
+
+_INDIC_RE = re.compile(r"[\u0900-\u097F\u0B80-\u0BFF]")
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_encodings = {}
+
+
+def _encoding_for(model: str):
+    if tiktoken is None:
+        return None
+    name = model if model.startswith("gpt-") else "gpt-4"
+    if name not in _encodings:
+        try:
+            _encodings[name] = tiktoken.encoding_for_model(name)
+        except KeyError:
+            _encodings[name] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[name]
+
+
+def count_tokens(text: str, model: str="gpt-4") -> int:
+    """Approximate token count for text as seen by the given model."""
+    if not text:
+        return 0
+    provider = metrics.provider_for(model)
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        count = len(encoding.encode(text))
+        return count if provider == "openai" else math.ceil(count * PROVIDER_TOKEN_FACTOR[provider])
+    # Heuristic: ~1.3 tokens per Latin word or punctuation mark, ~1 token per Devanagari/Tamil character
+    indic = len(_INDIC_RE.findall(text))
+    latin = len(_WORD_RE.findall(_INDIC_RE.sub(" ", text)))
+    return math.ceil((latin * 1.3 + indic * 1.0) * PROVIDER_TOKEN_FACTOR[provider])
+
+
+def _clause_calls(model: str, kind: str="clause") -> Tuple[float, float]:
+    # Summaries, Q&A, translations and failed calls have very different sizes and latencies
+    return metrics.LLM_REQUEST_SECONDS.summary(provider=metrics.provider_for(model), model=model, kind=kind, status="ok")
+
+
+def _observed_output_tokens(model: str, kind: str="clause") -> Optional[float]:
+    _, calls = _clause_calls(model, kind)
+    tokens_out = metrics.LLM_TOKENS.value(provider=metrics.provider_for(model), model=model, kind=kind, direction="out")
+    return tokens_out / calls if calls and tokens_out else None
+
+
+def seconds_per_call(model: str, kind: str="clause") -> float:
+    """Mean observed latency of this model's successful clause (or triage) calls, or a provider default."""
+    total, calls = _clause_calls(model, kind)
+    return total / calls if calls else DEFAULT_SECONDS_PER_CALL[metrics.provider_for(model)]
+
+
+def _parallelism(model: str) -> int:
+    if model.startswith("ollama-"):
+        from ollama_backend import OLLAMA_NUM_PARALLEL
+        return max(1, OLLAMA_NUM_PARALLEL)
+    return 1
+
+
+def estimate_clause_costs(clauses: List[str], model: str="gpt-4", language: str="English",
+                          kind: str="clause") -> List[Dict]:
+    """Per-clause input/output tokens, cost and seconds for a clause analysis (or cascade triage) run."""
+    output_tokens = _observed_output_tokens(model, kind) or DEFAULT_OUTPUT_TOKENS.get(language, DEFAULT_OUTPUT_TOKENS["English"])
+    output_tokens = min(output_tokens, CLAUSE_MAX_TOKENS)
+    price_in, price_out = MODEL_PRICING.get(model, (0.0, 0.0))
+    seconds = seconds_per_call(model, kind) / _parallelism(model)
+    estimates = []
+    for clause in clauses:
+        prompt, system_message = build_clause_prompt(clause, language)
+        if kind == "triage":
+            prompt += TRIAGE_PROMPT_SUFFIX
+        tokens_in = count_tokens(system_message + "\n" + prompt, model)
+        estimates.append({
+            "input_tokens": tokens_in,
+            "output_tokens": round(output_tokens),
+            "cost_usd": tokens_in / 1000 * price_in + output_tokens / 1000 * price_out,
+            "seconds": seconds
+        })
+    return estimates
+
+
+def estimate_analysis(clauses: List[str], model: str="gpt-4", language: str="English") -> Dict:
+    estimates = estimate_clause_costs(clauses, model, language)
+    return {
+        "model": model,
+        "clauses": len(clauses),
+        "input_tokens": sum(e["input_tokens"] for e in estimates),
+        "output_tokens": sum(e["output_tokens"] for e in estimates),
+        "cost_usd": round(sum(e["cost_usd"] for e in estimates), 4),
+        "seconds": round(sum(e["seconds"] for e in estimates), 1),
+        "observed": _clause_calls(model)[1] > 0
+    }
+
+
+def clauses_within_budget(clauses: List[str], model: str="gpt-4", language: str="English",
+                          token_budget: Optional[int]=None, time_budget: Optional[float]=None,
+                          triage_model: Optional[str]=None) -> int:
+    """Number of leading clauses whose estimated total tokens and wall time fit the budgets.
+
+    With a cascade triage_model every clause pays the triage call, and is budgeted as if it were also
+    escalated to model, since how many will be is only known afterwards.
+    """
+    estimates = estimate_clause_costs(clauses, model, language)
+    if triage_model:
+        triage = estimate_clause_costs(clauses, triage_model, language, kind="triage")
+        estimates = [{"input_tokens": e["input_tokens"] + t["input_tokens"],
+                      "output_tokens": e["output_tokens"] + t["output_tokens"],
+                      "seconds": e["seconds"] + t["seconds"]} for e, t in zip(estimates, triage)]
+    tokens = 0
+    seconds = 0.0
+    for count, estimate in enumerate(estimates):
+        tokens += estimate["input_tokens"] + estimate["output_tokens"]
+        seconds += estimate["seconds"]
+        if (token_budget is not None and tokens > token_budget) or (time_budget is not None and seconds > time_budget):
+            return count
+    return len(clauses)
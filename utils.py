@@ -6,63 +6,125 @@ from reportlab.lib.units import inch
 from reportlab.lib.colors import HexColor, black, white
 from reportlab.lib import colors
 import io
-from typing import List, Dict
+import os
+import re
+import tempfile
+import json
+import hashlib
+import functools
+from typing import List, Dict, BinaryIO, Iterator
 import html
-import textwrap
+from dotenv import load_dotenv
+from metrics import instrument
 
-def create_pdf_report(summary: str, overall_score: float, risky_clauses: List[Dict]) -> bytes:
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                          rightMargin=72, leftMargin=72, 
-                          topMargin=72, bottomMargin=18)
-    
-    # Get styles
+
+load_dotenv()
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")), "reports"))
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", "200"))
+
+RISK_COLORS = {"High": "#D32F2F", "Medium": "#F57C00", "Low": "#388E3C"}
+
+@functools.lru_cache(maxsize=1)
+def _report_styles() -> Dict[str, ParagraphStyle]:
+    # Built once per process; every report shares the same style objects
     styles = getSampleStyleSheet()
     
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        textColor=HexColor('#2E3440'),
-        alignment=1  # Center alignment
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=HexColor('#2E3440'),
-        leftIndent=0
-    )
-    
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=12,
-        textColor=HexColor('#3B4252'),
-        leftIndent=0,
-        rightIndent=0
-    )
-    
-    risk_style = ParagraphStyle(
-        'RiskStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=8,
-        textColor=HexColor('#2E3440'),
-        leftIndent=20
-    )
-    
-    # Build story
-    story = []
+    report_styles = {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            textColor=HexColor('#2E3440'),
+            alignment=1  # Center alignment
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+            textColor=HexColor('#2E3440'),
+            leftIndent=0
+        ),
+        'body': ParagraphStyle(
+            'CustomBody',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=12,
+            textColor=HexColor('#3B4252'),
+            leftIndent=0,
+            rightIndent=0
+        ),
+        'risk': ParagraphStyle(
+            'RiskStyle',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=8,
+            textColor=HexColor('#2E3440'),
+            leftIndent=20
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=HexColor('#5E81AC'),
+            alignment=1
+        )
+    }
     
+    for level, color in RISK_COLORS.items():
+        report_styles[f'header_{level}'] = ParagraphStyle(
+            f'ClauseHeader{level}',
+            parent=report_styles['risk'],
+            fontSize=12,
+            textColor=HexColor(color),
+            spaceAfter=6,
+            leftIndent=0
+        )
+    return report_styles
+
+def _truncate(text: str, limit: int) -> str:
+    text = text or ''
+    return html.escape(text[:limit] + "..." if len(text) > limit else text)
+
+def _clause_flowables(index: int, clause: Dict, styles: Dict[str, ParagraphStyle]) -> List:
+    risk_level = clause.get('risk', 'Medium')
+    header_style = styles.get(f'header_{risk_level}', styles['header_Medium'])
+    return [
+        Paragraph(f"<b>Clause {index} - {html.escape(risk_level)} Risk</b>", header_style),
+        Paragraph(f"<b>Text:</b> {_truncate(clause.get('clause', ''), 200)}", styles['risk']),
+        Paragraph(f"<b>📝 Analysis:</b> {_truncate(clause.get('explanation', ''), 300)}", styles['risk']),
+        Paragraph(f"<b>💡 Recommendation:</b> {_truncate(clause.get('suggestion', ''), 250)}", styles['risk']),
+        Spacer(1, 15)
+    ]
+
+class _LazyStory(list):
+    """Story that creates flowables from an iterator as the document consumes them.
+
+    The doc template pops flowables off the front while it lays out pages, so only a short
+    lookahead of Paragraph objects exists at any time instead of one per clause field.
+    """
+
+    def __init__(self, flowables: Iterator, lookahead: int=32):
+        super().__init__()
+        self._source = flowables
+        self._lookahead = lookahead
+
+    def __len__(self):
+        # build() checks len() before taking every flowable
+        while super().__len__() < self._lookahead:
+            flowable = next(self._source, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return super().__len__()
+
+def _report_flowables(summary: str, overall_score: float, risky_clauses: List[Dict],
+                      styles: Dict[str, ParagraphStyle]) -> Iterator:
     # Title
-    story.append(Paragraph("⚖️ Legal Contract Risk Analysis Report", title_style))
-    story.append(Spacer(1, 20))
+    yield Paragraph("⚖️ Legal Contract Risk Analysis Report", styles['title'])
+    yield Spacer(1, 20)
     
     # Overall Risk Score with colored background
     risk_color = "#D32F2F" if overall_score > 70 else "#F57C00" if overall_score > 40 else "#388E3C"
@@ -80,67 +142,102 @@ def create_pdf_report(summary: str, overall_score: float, risky_clauses: List[Di
         ('TOPPADDING', (0, 0), (-1, -1), 12),
         ('GRID', (0, 0), (-1, -1), 1, colors.white)
     ]))
-    story.append(risk_table)
-    story.append(Spacer(1, 30))
-    
-    # Contract Summary
-    story.append(Paragraph("📋 Contract Summary", heading_style))
+    yield risk_table
+    yield Spacer(1, 30)
     
-    # Wrap summary text properly
-    wrapped_summary = textwrap.fill(summary, width=80)
-    story.append(Paragraph(wrapped_summary.replace('\n', '<br/>'), body_style))
-    story.append(Spacer(1, 20))
+    # Contract Summary, one flowable per paragraph so long summaries break across pages
+    yield Paragraph("📋 Contract Summary", styles['heading'])
+    for paragraph in re.split(r'\n\s*\n', summary or ''):
+        if paragraph.strip():
+            yield Paragraph(html.escape(paragraph.strip()).replace('\n', '<br/>'), styles['body'])
+    yield Spacer(1, 20)
     
     # Risk Analysis
-    story.append(Paragraph("🔍 Detailed Risk Analysis", heading_style))
-    
-    for i, clause in enumerate(risky_clauses[:8], 1):  
-        # Risk level styling
-        risk_level = clause.get('risk', 'Medium')
-        risk_color_text = "#D32F2F" if risk_level == "High" else "#F57C00" if risk_level == "Medium" else "#388E3C"
-        
-        # Clause header
-        clause_header = f"<b>Clause {i} - {risk_level} Risk</b>"
-        story.append(Paragraph(clause_header, ParagraphStyle(
-            'ClauseHeader',
-            parent=risk_style,
-            fontSize=12,
-            textColor=HexColor(risk_color_text),
-            spaceAfter=6,
-            leftIndent=0
-        )))
-        
-        # Clause text (truncated)
-        clause_text = clause.get('clause', '')[:200] + "..." if len(clause.get('clause', '')) > 200 else clause.get('clause', '')
-        story.append(Paragraph(f"<b>Text:</b> {clause_text}", risk_style))
-        
-        # Explanation
-        explanation = clause.get('explanation', '')[:300] + "..." if len(clause.get('explanation', '')) > 300 else clause.get('explanation', '')
-        story.append(Paragraph(f"<b>📝 Analysis:</b> {explanation}", risk_style))
-        
-        # Suggestion
-        suggestion = clause.get('suggestion', '')[:250] + "..." if len(clause.get('suggestion', '')) > 250 else clause.get('suggestion', '')
-        story.append(Paragraph(f"<b>💡 Recommendation:</b> {suggestion}", risk_style))
-        
-        story.append(Spacer(1, 15))
+    yield Paragraph("🔍 Detailed Risk Analysis", styles['heading'])
+    for i, clause in enumerate(risky_clauses, 1):
+        yield from _clause_flowables(i, clause, styles)
     
     # Footer
-    story.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=HexColor('#5E81AC'),
-        alignment=1
-    )
-    story.append(Paragraph("Generated by LegalRiskBot - AI-Powered Contract Analysis", footer_style))
-    story.append(Paragraph("⚠️ This analysis is for informational purposes only. Consult legal professionals for specific advice.", footer_style))
+    yield Spacer(1, 30)
+    yield Paragraph("Generated by LegalRiskBot - AI-Powered Contract Analysis", styles['footer'])
+    yield Paragraph("⚠️ This analysis is for informational purposes only. Consult legal professionals for specific advice.", styles['footer'])
+
+@instrument("create_pdf_report")
+def write_pdf_report(output: BinaryIO, summary: str, overall_score: float, risky_clauses: List[Dict]):
+    """Render the risk report for every clause into a binary file object.
+
+    Flowables are created as pages are laid out. ReportLab still keeps the finished, compressed
+    page streams in memory until the document is saved, so memory grows with page count, not
+    with the number of clause paragraphs.
+    """
+    doc = SimpleDocTemplate(output, pagesize=A4, 
+                          rightMargin=72, leftMargin=72, 
+                          topMargin=72, bottomMargin=18)
+    styles = _report_styles()
+    doc.build(_LazyStory(_report_flowables(summary, overall_score, risky_clauses, styles)))
+
+def create_pdf_report(summary: str, overall_score: float, risky_clauses: List[Dict]) -> bytes:
+    buffer = io.BytesIO()
+    write_pdf_report(buffer, summary, overall_score, risky_clauses)
+    return buffer.getvalue()
+
+def report_id(summary: str, overall_score: float, risky_clauses: List[Dict]) -> str:
+    """Content hash identifying a rendered report"""
+    payload = json.dumps([summary, overall_score, risky_clauses], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_pdf_report(summary: str, overall_score: float, risky_clauses: List[Dict]) -> BinaryIO:
+    """Open file of the rendered report, rendering it into REPORT_CACHE_DIR on first request.
+
+    The file is opened before anything can prune it, so concurrent requests never lose it before sending.
+    """
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(REPORT_CACHE_DIR, f"{report_id(summary, overall_score, risky_clauses)}.pdf")
+    try:
+        report = open(path, 'rb')
+    except FileNotFoundError:
+        report = None
+    if report is not None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return report
     
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer.read()
+    # A unique temp file per render: threads of one worker may render the same report at once
+    fd, tmp_path = tempfile.mkstemp(dir=REPORT_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_pdf_report(f, summary, overall_score, risky_clauses)
+        report = open(tmp_path, 'rb')
+        os.replace(tmp_path, path)
+    except BaseException:
+        if report is not None:
+            report.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _prune_report_cache(keep=path)
+    return report
+
+def _prune_report_cache(keep: str=""):
+    reports = [os.path.join(REPORT_CACHE_DIR, name) for name in os.listdir(REPORT_CACHE_DIR) if name.endswith('.pdf')]
+    if len(reports) <= REPORT_CACHE_MAX_FILES:
+        return
+    reports = [path for path in reports if path != keep]
+    mtimes = {}
+    for path in reports:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:  # Removed by a concurrent prune
+            pass
+    for path in sorted(mtimes, key=mtimes.get)[:len(mtimes) + 1 - REPORT_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
+@instrument("highlight_text_html")
 def highlight_text_html(full_text: str, clause_annotations: List[Dict]) -> str:
  
     html_out = html.escape(full_text)